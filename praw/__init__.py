@@ -14,12 +14,15 @@
 
 """Reddit object."""
 
-import json
 import os
 import platform
+import re
 import requests
 import six
 import sys
+import time
+import weakref
+from collections import deque
 from requests.compat import urljoin
 from update_checker import update_check
 from warnings import warn, warn_explicit
@@ -37,6 +40,7 @@ class Config(object):  # pylint: disable-msg=R0903
     """A class containing the configuration for a reddit site."""
     API_PATHS = {'approve':             'api/approve/',
                  'banned':              'r/%s/about/banned/',
+                 'by_id':               'by_id/',
                  'captcha':             'captcha/',
                  'clearflairtemplates': 'api/clearflairtemplates/',
                  'comment':             'api/comment/',
@@ -101,6 +105,32 @@ class Config(object):  # pylint: disable-msg=R0903
                  'username_available':  'api/username_available/',
                  'vote':                'api/vote/'}
     SSL_PATHS = ('login', )
+    MORE_COMMENTS_ORDERS = ('largest', 'shallowest')
+    # Matches the path of an API_PATHS URL, naming the group of the path
+    ENDPOINT_RE = re.compile('^(?:%s)/?$' % '|'.join(
+        '(?P<%s>%s)' % (name, re.escape(path.strip('/')).replace(
+            re.escape('%s'), '[^/]+')) for (name, path) in
+        sorted(six.iteritems(API_PATHS))))
+    # Matches the subreddit or user a listing path is scoped to
+    SCOPE_RE = re.compile('^(?:r|user)/[^/]+/')
+
+    @classmethod
+    def parse_endpoint_times(cls, value):
+        """
+        Parse a praw.ini list of endpoint times, e.g. `moderators=300, new=5`.
+
+        Return a dict mapping API_PATHS names to seconds.
+        """
+        times = {}
+        for item in value.split(','):
+            if not item.strip():
+                continue
+            name, _, seconds = item.partition('=')
+            name = name.strip()
+            if name not in cls.API_PATHS:
+                raise errors.ClientException('Unknown endpoint: %s' % name)
+            times[name] = float(seconds)
+        return times
 
     def __init__(self, site_name):
         obj = dict(CONFIG.items(site_name))
@@ -109,6 +139,7 @@ class Config(object):  # pylint: disable-msg=R0903
             self._ssl_url = 'https://' + obj['ssl_domain']
         else:
             self._ssl_url = None
+        self.api_request_burst = int(obj['api_request_burst'])
         self.api_request_delay = float(obj['api_request_delay'])
         self.by_kind = {obj['comment_kind']:    objects.Comment,
                         obj['message_kind']:    objects.Message,
@@ -120,7 +151,16 @@ class Config(object):  # pylint: disable-msg=R0903
         self.by_object = dict((value, key) for (key, value) in
                               six.iteritems(self.by_kind))
         self.by_object[objects.LoggedInRedditor] = obj['redditor_kind']
+        # A BaseCache engine from praw.cache to store results in, in place
+        # of the one chosen by cache_file
+        self.cache = None
+        self.cache_file = obj['cache_file'] or None
+        self.cache_max_bytes = int(obj['cache_max_bytes'])
+        self.cache_max_entries = int(obj['cache_max_entries'])
+        self.cache_stale_while_revalidate = self.parse_endpoint_times(
+            obj['cache_stale_while_revalidate'])
         self.cache_timeout = float(obj['cache_timeout'])
+        self.cache_timeouts = self.parse_endpoint_times(obj['cache_timeouts'])
         if obj['check_for_updates'] \
                 and obj['check_for_updates'].lower() == 'true':
             self.check_for_updates = True
@@ -128,17 +168,31 @@ class Config(object):  # pylint: disable-msg=R0903
             self.check_for_updates = False
         self.comment_limit = int(obj['comment_limit'])
         self.comment_sort = obj['comment_sort']
+        self.compact_objects = obj['compact_objects'].lower() == 'true'
+        self.content_page_max = int(obj['content_page_max'])
         self.default_content_limit = int(obj['default_content_limit'])
         self.domain = obj['domain']
         self.gold_comments_max = int(obj['gold_comments_max'])
+        self.json_backend = obj['json_backend'] or None
+        self.lazy_objects = obj['lazy_objects'].lower() == 'true'
+        self.more_children_max = int(obj['more_children_max'])
+        if self.more_children_max < 1:
+            raise errors.ClientException('more_children_max must be at '
+                                         'least 1')
         self.more_comments_max = int(obj['more_comments_max'])
+        self.more_comments_order = obj['more_comments_order'] or None
+        if self.more_comments_order not in (None,) + self.MORE_COMMENTS_ORDERS:
+            raise errors.ClientException('Invalid more_comments_order: %s'
+                                         % self.more_comments_order)
         self.log_requests = int(obj['log_requests'])
+        self.rate_limit_file = obj['rate_limit_file'] or None
         self.regular_comments_max = int(obj['regular_comments_max'])
 
         if 'short_domain' in obj:
             self._short_domain = 'http://' + obj['short_domain']
         else:
             self._short_domain = None
+        self.stream_json = obj['stream_json'].lower() == 'true'
         self.timeout = float(obj['timeout'])
         try:
             self.user = obj['user'] if obj['user'] else None
@@ -153,6 +207,23 @@ class Config(object):  # pylint: disable-msg=R0903
             return urljoin(self._ssl_url, self.API_PATHS[key])
         return urljoin(self._site_url, self.API_PATHS[key])
 
+    def endpoint(self, url):
+        """
+        Return the API_PATHS name of url, or None if it has none.
+
+        The listings of a subreddit or user, e.g. r/<name>/new/, are named
+        after the site wide listing with the same path, e.g. new.
+        """
+        for site_url in (self._site_url, self._ssl_url):
+            if site_url and url.startswith(site_url):
+                path = url[len(site_url):].strip('/')
+                if path.endswith('.json'):
+                    path = path[:-5].rstrip('/')
+                match = (self.ENDPOINT_RE.match(path) or
+                         self.ENDPOINT_RE.match(self.SCOPE_RE.sub('', path)))
+                return match.lastgroup if match else None
+        return None
+
     @property
     def short_domain(self):
         """
@@ -170,6 +241,7 @@ class Config(object):  # pylint: disable-msg=R0903
 class BaseReddit(object):
     """The base class for a reddit session."""
     DEFAULT_HEADERS = {}
+    REQUEST_ATTEMPTS = 3
     RETRY_CODES = [502, 503, 504]
     update_checked = False
 
@@ -197,10 +269,14 @@ class BaseReddit(object):
         if not user_agent or not isinstance(user_agent, six.string_types):
             raise TypeError('User agent must be a non-empty string.')
 
-        self.DEFAULT_HEADERS['User-agent'] = UA_STRING % user_agent
         self.config = Config(site_name or os.getenv('REDDIT_SITE') or 'reddit')
         self.http = requests.session()
+        self.http.headers.update(self.DEFAULT_HEADERS)
+        self.http.headers['User-Agent'] = UA_STRING % user_agent
         self.modhash = self.user = None
+        # The Redditor and Subreddit objects of the author, subreddit and
+        # similar attributes of objects, by class and name
+        self._flyweights = weakref.WeakValueDictionary()
 
         # Check for updates if permitted and this is the first Reddit instance
         if not disable_update_check and not self.update_checked \
@@ -212,7 +288,7 @@ class BaseReddit(object):
         return 'Open Session (%s)' % (self.user or 'Unauthenticated')
 
     def _request(self, page_url, params=None, url_data=None, timeout=None,
-                 raw=False):
+                 raw=False, stream=False):
         """
         Given a page url and a dict of params, open and return the page.
 
@@ -220,45 +296,126 @@ class BaseReddit(object):
         :param params: a dictionary containing the extra data to submit
         :param url_data: a dictionary containing the GET data to put in the url
         :param raw: return the response object rather than the response body
+        :param stream: return the response object before its body has been
+            downloaded. Such a request is never cached.
         :returns: either the response body or the response object
         """
         # pylint: disable-msg=W0212
         timeout = self.config.timeout if timeout is None else timeout
-        remaining_attempts = 3
+        kwargs = {'raw': True, 'stream': True} if stream else {'raw': raw}
+        remaining_attempts = self.REQUEST_ATTEMPTS
         while True:
             try:
                 return helpers._request(self, page_url, url_data, params,
-                                        timeout, raw=raw)
-            except requests.exceptions.HTTPError as error:
-                remaining_attempts -= 1
-                if (error.response.status_code not in self.RETRY_CODES or
-                    remaining_attempts == 0):
-                    raise
-            except requests.exceptions.RequestException:
+                                        timeout, **kwargs)
+            except requests.exceptions.RequestException as error:
                 remaining_attempts -= 1
-                if remaining_attempts == 0:
+                if not self._should_retry(error, remaining_attempts):
                     raise
 
+    def _should_retry(self, error, remaining_attempts):
+        """Return whether a request that failed with error is to be retried."""
+        if remaining_attempts <= 0:
+            return False
+        if isinstance(error, requests.exceptions.HTTPError):
+            return error.response.status_code in self.RETRY_CODES
+        return True
+
+    def _get_flyweight(self, object_class, name):
+        """
+        Return the unfetched object_class object named name of the session.
+
+        As long as it is referenced the same object is returned for the same
+        name, so that it is created and fetched only once.
+        """
+        key = (object_class, name)
+        flyweight = self._flyweights.get(key)
+        if flyweight is None:
+            flyweight = self._flyweights.setdefault(
+                key, object_class(self, name, fetch=False))
+        return flyweight
+
+    def _get_page_url_data(self, url_data, remaining):
+        """
+        Return the GET data to request the next page of a listing with.
+
+        Up to content_page_max of the remaining entries (all of them if
+        remaining is None) are asked for, unless url_data has its own limit.
+        """
+        page_url_data = dict(url_data)
+        page_max = self.config.content_page_max
+        if page_max > 0 and 'limit' not in url_data:
+            page_url_data['limit'] = (page_max if remaining is None else
+                                      min(page_max, remaining))
+        return page_url_data
+
     def _json_reddit_objecter(self, json_data):
         """
-        Object hook to be used with json.load(s) to spit out RedditObjects
-        while decoding.
+        Return decoded JSON data with its things made into RedditObjects.
+
+        The data is walked once, innermost things first. Within the data of a
+        thing only the dicts with a kind, such as the listing of a comment's
+        replies, are visited, so that e.g. media dicts are left as they are.
         """
+        if isinstance(json_data, list):
+            return [self._json_reddit_objecter(item) for item in json_data]
         try:
             object_class = self.config.by_kind[json_data['kind']]
         except KeyError:
+            for key, value in six.iteritems(json_data):
+                if isinstance(value, (dict, list)):
+                    json_data[key] = self._json_reddit_objecter(value)
             if 'json' in json_data:
                 if len(json_data) != 1:
                     warn_explicit('Unknown object type: %s' %
                                   json_data, UserWarning, '', 0)
                 return json_data['json']
+        except TypeError:  # Neither a dict nor a list
+            pass
         else:
-            return object_class.from_api_response(self, json_data['data'])
+            thing_data = json_data['data']
+            for key, value in six.iteritems(thing_data):
+                if isinstance(value, dict) and 'kind' in value:
+                    thing_data[key] = self._json_reddit_objecter(value)
+            return object_class.from_api_response(self, thing_data)
         return json_data
 
+    def _parse_json(self, response, as_objects=True):
+        """Decode a response body and update the modhash from it."""
+        # pylint: disable-msg=W0212
+        data = helpers._get_json_loads(self.config.json_backend)(response)
+        if as_objects:
+            data = self._json_reddit_objecter(data)
+        self._update_modhash(data)
+        return data
+
+    def _request_json_stream(self, page_url, path, url_data=None):
+        """
+        Request a page and return a helpers._JSONStream decoding it.
+
+        Iterating over the stream yields the objects of the list at path, e.g.
+        ('data', 'children'), as they are downloaded and decoded. API errors
+        are raised once the whole page has been decoded.
+        """
+        # pylint: disable-msg=W0212
+        page_url += '.json'
+        response = self._request(page_url, url_data=url_data, stream=True)
+
+        def check(data):
+            """Update the modhash from the page and raise its API errors."""
+            self._update_modhash(data)
+            decorators.raise_api_errors(data, page_url)
+        return helpers._JSONStream(response, path, self._json_reddit_objecter,
+                                   check)
+
+    def _update_modhash(self, data):
+        """Update the modhash from decoded response data."""
+        if self.user and 'data' in data and 'modhash' in data['data']:
+            self.modhash = data['data']['modhash']
+
     def get_content(self, page_url, limit=0, url_data=None, place_holder=None,
                     root_field='data', thing_field='children',
-                    after_field='after'):
+                    after_field='after', prefetch=False, checkpoint=None):
         """
         A generator method to return reddit content from a URL.
 
@@ -270,7 +427,9 @@ class BaseReddit(object):
         :param limit: the maximum number of content entries to fetch. If
             limit <= 0, fetch the default_content_limit for the site. If None,
             then fetch unlimited entries--this would be used in conjunction
-            with the place_holder param.
+            with the place_holder param. Each page requests up to
+            content_page_max of the remaining entries, unless url_data
+            contains a `limit` of its own.
         :param url_data: dictionary containing extra GET data to put in the url
         :param place_holder: if not None, the method will fetch `limit`
             content, stopping if it finds content with `id` equal to
@@ -282,42 +441,66 @@ class BaseReddit(object):
             contains the list of things. Most objects use 'children'.
         :param after_field: indicates the field which holds the after item
             element
+        :param prefetch: if True, request the next page in a background thread
+            as soon as a page arrives, so that it is usually available by the
+            time the current page has been consumed. The request is still
+            subject to api_request_delay. Prefetching is disabled when
+            stream_json is set in praw.ini, as the next page is then only
+            known once the current one has been downloaded.
+        :param checkpoint: if not None, a checkpoint from praw.checkpoints
+            the position in the listing is saved to as every entry is
+            returned. A crawl given the checkpoint of an interrupted crawl
+            resumes with the entry after the last one returned, and one given
+            the checkpoint of a finished crawl returns nothing.
         :type place_holder: a string corresponding to a reddit content id, e.g.
             't3_asdfasdf'
         :returns: a list of reddit content, of type Subreddit, Comment,
             Submission or user flair.
         """
-        objects_found = 0
-
-        if url_data is None:
-            url_data = {}
-        if limit is None:
-            fetch_all = True
-        elif limit <= 0:
-            fetch_all = False
-            limit = int(self.config.default_content_limit)
-        else:
-            fetch_all = False
-
+        # pylint: disable-msg=W0212
+        pager = helpers._ListingPager(self, limit, url_data, place_holder,
+                                      checkpoint)
+        next_page = None
         # While we still need to fetch more content to reach our limit, do so.
-        while fetch_all or objects_found < limit:
-            page_data = self.request_json(page_url, url_data=url_data)
-            if root_field:
-                root = page_data[root_field]
+        while True:
+            page_url_data = pager.page_url_data()
+            if page_url_data is None:
+                return
+            stream = None
+            if next_page:
+                page_data = next_page.result()
+                next_page = None
+            elif self.config.stream_json:
+                path = (root_field, thing_field) if root_field else \
+                    (thing_field,)
+                stream = self._request_json_stream(page_url, path,
+                                                   page_url_data)
             else:
-                root = page_data
-            for thing in root[thing_field]:
-                yield thing
-                objects_found += 1
-                # Terminate when we've reached the limit, or place holder
-                if (objects_found == limit or
-                    place_holder and thing.id == place_holder):
+                page_data = self.request_json(page_url,
+                                              url_data=page_url_data)
+            if stream:
+                # The size of the page and its after field are only known
+                # once it has been decoded
+                for thing in pager.entries(stream):
+                    yield thing
+                if pager.done:
                     return
-            # Set/update the 'after' parameter for the next iteration
-            if after_field in root and root[after_field]:
-                url_data['after'] = root[after_field]
+                root = stream.root[root_field] if root_field else stream.root
+                after = root[after_field] if after_field in root else None
             else:
-                return
+                root = page_data[root_field] if root_field else page_data
+                after = root[after_field] if after_field in root else None
+                page_size = len(root[thing_field])
+                next_url_data = prefetch and pager.next_page_url_data(
+                    after, page_size)
+                if next_url_data:
+                    next_page = helpers._Prefetcher(
+                        self.request_json, page_url, url_data=next_url_data)
+                for thing in pager.entries(root[thing_field], page_size,
+                                           after):
+                    yield thing
+            # Set/update the 'after' parameter for the next iteration
+            pager.end_page(after)
 
     @decorators.parse_api_json_response
     def request_json(self, page_url, params=None, url_data=None,
@@ -337,15 +520,102 @@ class BaseReddit(object):
         """
         page_url += '.json'
         response = self._request(page_url, params, url_data)
-        if as_objects:
-            hook = self._json_reddit_objecter
-        else:
-            hook = None
-        data = json.loads(response, object_hook=hook)
-        # Update the modhash
-        if self.user and 'data' in data and 'modhash' in data['data']:
-            self.modhash = data['data']['modhash']
-        return data
+        return self._parse_json(response, as_objects)
+
+    def stream_content(self, page_url, url_data=None, skip_existing=False,
+                       max_interval=60, seen_max=1000, checkpoint=None):
+        """
+        A generator method to return new reddit content from a URL forever.
+
+        The newest page of the listing, which must be sorted by creation, is
+        polled without going through the cache, and the things that were not
+        returned yet are returned oldest first. When none of a page is known
+        yet, older pages are requested until the last known thing is reached,
+        so that bursts are not missed. The time between polls is halved when
+        new things were found, down to api_request_delay, and doubled when
+        none were, up to max_interval.
+
+        :param page_url: the url of the listing to poll
+        :param url_data: dictionary containing extra GET data to put in the url
+        :param skip_existing: if True, only return things that appear after
+            the first poll rather than the content of the first page too.
+        :param max_interval: the maximum time, in seconds, between polls
+        :param seen_max: the number of most recent fullnames remembered to
+            tell the new things from those already returned. It should be
+            larger than content_page_max.
+        :param checkpoint: if not None, a checkpoint from praw.checkpoints the
+            newest thing returned is saved to. A stream given the checkpoint of
+            a stopped one starts with the things that appeared since.
+        :returns: a never ending generator of Comment or Submission objects.
+        """
+        url_data = dict(url_data or {})
+        cursor = checkpoint.load() if checkpoint is not None else None
+        high_water = cursor['high_water'] if cursor else None
+        seen = set()
+        seen_order = deque()
+        min_interval = self.config.api_request_delay
+        interval = min_interval
+
+        def thing_number(fullname):
+            """Return the creation order of a thing from its fullname."""
+            return int(fullname.split('_', 1)[1], 36)
+
+        while True:
+            poll_time = time.time()
+            new_things = []
+            after = None
+            # Without seen fullnames, after a restart, only the high water
+            # mark tells the new things. Once running, the seen fullnames also
+            # let through things that appear on the newest page late.
+            resuming = not seen
+            while True:
+                page_url_data = self._get_page_url_data(url_data, None)
+                if after:
+                    page_url_data['after'] = after
+                # A raw request is never cached, so that the page is current
+                response = self._request(page_url + '.json',
+                                         url_data=page_url_data, raw=True)
+                page_data = self._parse_json(response.text)
+                decorators.raise_api_errors(page_data, page_url)
+                things = page_data['data']['children']
+                for thing in things:
+                    if thing.name in seen or (resuming or after) and (
+                            high_water and thing_number(thing.name) <=
+                            thing_number(high_water)):
+                        break
+                    new_things.append(thing)
+                else:
+                    after = page_data['data']['after']
+                    if after and (seen or high_water):
+                        continue
+                break
+            if high_water is None and skip_existing:
+                new_things, skipped = [], new_things
+                for thing in skipped:
+                    seen.add(thing.name)
+                    seen_order.append(thing.name)
+                if skipped:
+                    high_water = skipped[0].name
+                    if checkpoint is not None:
+                        checkpoint.save({'high_water': high_water})
+            for thing in reversed(new_things):
+                seen.add(thing.name)
+                seen_order.append(thing.name)
+                if len(seen_order) > seen_max:
+                    seen.discard(seen_order.popleft())
+                if high_water is None or (thing_number(thing.name) >
+                                          thing_number(high_water)):
+                    high_water = thing.name
+                    if checkpoint is not None:
+                        checkpoint.save({'high_water': high_water})
+                yield thing
+            if new_things:
+                interval = max(min_interval, interval / 2.0)
+            else:
+                interval = min(max_interval, max(interval, 1) * 2)
+            delay = poll_time + interval - time.time()
+            if delay > 0:
+                time.sleep(delay)
 
 
 class SubredditExtension(BaseReddit):
@@ -770,6 +1040,21 @@ class Reddit(LoggedInExtension,  # pylint: disable-msg=R0904
     def __init__(self, *args, **kwargs):
         super(Reddit, self).__init__(*args, **kwargs)
 
+    def _get_info_bulk(self, fullnames):
+        """Yield the submissions of fullnames, see get_info_bulk."""
+        for i in range(0, len(fullnames), 100):
+            chunk = fullnames[i:i + 100]
+            url = urljoin(self.config['by_id'], ','.join(chunk))
+            found = dict((thing.name, thing) for thing in
+                         self.request_json(url)['data']['children'])
+            missing = [name for name in chunk if name not in found]
+            if missing:
+                warn_explicit('Unable to find: %s' % ', '.join(missing),
+                              UserWarning, '', 0)
+            for name in chunk:
+                if name in found:
+                    yield found[name]
+
     @decorators.RequireCaptcha
     def create_redditor(self, user_name, password, email='', captcha=None):
         """Register a new user."""
@@ -830,6 +1115,29 @@ class Reddit(LoggedInExtension,  # pylint: disable-msg=R0904
             return self.get_random_subreddit()
         return objects.Subreddit(self, subreddit_name, *args, **kwargs)
 
+    def stream_comments(self, subreddit='all', **kwargs):
+        """
+        Return a generator of the new comments of a subreddit, forever.
+
+        subreddit is a Subreddit object or the name of one, 'all' meaning
+        every subreddit. Takes the same keyword parameters as stream_content.
+        """
+        url = urljoin(self.config['subreddit'] % six.text_type(subreddit),
+                      'comments/')
+        return self.stream_content(url, **kwargs)
+
+    def stream_submissions(self, subreddit='all', **kwargs):
+        """
+        Return a generator of the new submissions of a subreddit, forever.
+
+        subreddit is a Subreddit object or the name of one, 'all' meaning
+        every subreddit. Takes the same keyword parameters as stream_content.
+        """
+        url = urljoin(self.config['subreddit'] % six.text_type(subreddit),
+                      'new/')
+        kwargs['url_data'] = dict(kwargs.get('url_data') or {}, sort='new')
+        return self.stream_content(url, **kwargs)
+
     def info(self, url=None, thing_id=None, limit=0):
         """
         Given url, queries the API to see if the given URL has been submitted
@@ -852,6 +1160,26 @@ class Reddit(LoggedInExtension,  # pylint: disable-msg=R0904
         return self.get_content(self.config['info'], url_data=url_data,
                                 limit=limit)
 
+    def get_info_bulk(self, fullnames):
+        """
+        Return a generator for the submissions with the given fullnames.
+
+        Up to 100 fullnames are looked up per request. Submissions are yielded
+        in the order of fullnames; those that cannot be found are skipped with
+        a warning listing their fullnames. As reddit only looks up links by
+        fullname, a ClientException is raised if any other fullname is given.
+
+        :param fullnames: an iterable of submission fullnames, e.g.
+            't3_asdfasdf'
+        """
+        fullnames = list(fullnames)
+        prefix = self.config.by_object[objects.Submission] + '_'
+        others = [name for name in fullnames if not name.startswith(prefix)]
+        if others:
+            raise errors.ClientException('Not submission fullnames: %s'
+                                         % ', '.join(others))
+        return self._get_info_bulk(fullnames)
+
     def is_username_available(self, username):
         """Return True if username is valid and available, otherwise False."""
         url_data = {'user': username}
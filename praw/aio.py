@@ -0,0 +1,227 @@
+# This file is part of PRAW.
+#
+# PRAW is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# PRAW is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# PRAW.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Asyncio support, requires Python 3.6 or later.
+
+AsyncReddit is a reddit session whose requests can be awaited, so that a
+single event loop can drive many sessions and listings at once. Requests share
+the cache and the rate limit schedule of the synchronous sessions, but wait for
+their request slot with asyncio.sleep instead of blocking. As the requests
+library is blocking, the HTTP exchange itself runs in the event loop's default
+executor.
+"""
+
+import asyncio
+import functools
+import sys
+import threading
+import time
+
+import requests
+
+from praw import Reddit, decorators, helpers
+
+
+def _wait_for_flight(flight):
+    """Return a future for the outcome of a call in flight in any thread."""
+    loop = asyncio.get_event_loop()
+    future = loop.create_future()
+
+    def copy_outcome(flight):
+        """Copy the outcome of the flight to the future."""
+        if future.done():  # Cancelled
+            return
+        if flight.exc_info:
+            future.set_exception(flight.exc_info[1])
+        else:
+            future.set_result(flight.result)
+    flight.add_done_callback(
+        lambda flight: loop.call_soon_threadsafe(copy_outcome, flight))
+    return future
+
+
+class AsyncListing(object):
+    """
+    The content of a listing, iterable with both for and async for.
+
+    Iterating with async for pages through the listing without blocking the
+    event loop. Plain iteration blocks like Reddit.get_content does, so the
+    methods of Reddit consuming listings keep working on an AsyncReddit.
+    """
+    def __init__(self, reddit_session, args, kwargs):
+        self.reddit_session = reddit_session
+        self._args = args
+        self._kwargs = kwargs
+        self._iterator = None
+
+    def __aiter__(self):
+        # pylint: disable-msg=W0212
+        return self.reddit_session._get_content_async(*self._args,
+                                                      **self._kwargs)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._iterator is None:
+            self._iterator = Reddit.get_content(self.reddit_session,
+                                                *self._args, **self._kwargs)
+        return next(self._iterator)
+
+
+class AsyncReddit(Reddit):
+    """
+    A reddit session for use with asyncio.
+
+    request_json_async is the coroutine version of request_json and every
+    listing, e.g. get_new or Subreddit.get_hot, returns an AsyncListing to be
+    consumed with async for. The remaining methods, as well as the lazily
+    loaded attributes of objects, still block.
+    """
+    def __init__(self, *args, **kwargs):
+        super(AsyncReddit, self).__init__(*args, **kwargs)
+        self._refreshes = set()
+
+    async def _fetch_async(self, page_url, args, kwargs):
+        """Make a request once its rate limit slot has come, with retries."""
+        # pylint: disable-msg=W0212
+        sleep_after = helpers._request.function
+        request = functools.partial(sleep_after.function, self, page_url,
+                                    *args, **kwargs)
+        loop = asyncio.get_event_loop()
+        remaining_attempts = self.REQUEST_ATTEMPTS
+        while True:
+            delay = sleep_after.reserve(self)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                return await loop.run_in_executor(None, request)
+            except requests.exceptions.RequestException as error:
+                remaining_attempts -= 1
+                if not self._should_retry(error, remaining_attempts):
+                    raise
+
+    async def _fly_async(self, key, flight, page_url, args, kwargs,
+                         call_time):
+        """Coroutine version of Memoize.fly."""
+        # pylint: disable-msg=W0212
+        memoize = helpers._request
+        try:
+            call_kwargs, stale = memoize.prepare(self, page_url, args, kwargs)
+            response = await self._fetch_async(page_url, args, call_kwargs)
+            result = memoize.store(self, page_url, args, kwargs, response,
+                                   stale, call_time)
+        except BaseException:
+            memoize.land(key, flight, exc_info=sys.exc_info())
+            raise
+        memoize.land(key, flight, result)
+        return result
+
+    async def _get_content_async(self, page_url, limit=0, url_data=None,
+                                 place_holder=None, root_field='data',
+                                 thing_field='children', after_field='after',
+                                 prefetch=False, checkpoint=None):
+        """Asynchronous generator version of Reddit.get_content."""
+        # pylint: disable-msg=W0212
+        pager = helpers._ListingPager(self, limit, url_data, place_holder,
+                                      checkpoint)
+        next_page = None
+        try:
+            while True:
+                page_url_data = pager.page_url_data()
+                if page_url_data is None:
+                    return
+                if next_page:
+                    page_data = await next_page
+                    next_page = None
+                else:
+                    page_data = await self.request_json_async(
+                        page_url, url_data=page_url_data)
+                root = page_data[root_field] if root_field else page_data
+                after = root[after_field] if after_field in root else None
+                page_size = len(root[thing_field])
+                next_url_data = prefetch and pager.next_page_url_data(
+                    after, page_size)
+                if next_url_data:
+                    next_page = asyncio.ensure_future(self.request_json_async(
+                        page_url, url_data=next_url_data))
+                for thing in pager.entries(root[thing_field], page_size,
+                                           after):
+                    yield thing
+                pager.end_page(after)
+        finally:
+            if next_page:
+                next_page.cancel()
+
+    def _refresh_done(self, refresh):
+        """Forget a finished background refresh, leaving errors to waiters."""
+        self._refreshes.discard(refresh)
+        if not refresh.cancelled():
+            refresh.exception()
+
+    async def _request_async(self, page_url, params=None, url_data=None,
+                             timeout=None, raw=False):
+        """Coroutine version of Reddit._request."""
+        # pylint: disable-msg=W0212
+        memoize = helpers._request
+        timeout = self.config.timeout if timeout is None else timeout
+        args = (url_data, params, timeout)
+        kwargs = {'raw': raw}
+        call_time = time.time()
+        try:
+            return memoize.get(self, page_url, args, kwargs, call_time)
+        except KeyError:
+            pass
+        key = memoize.flight_key(self, page_url, args, kwargs)
+        if key is None:
+            return await self._fetch_async(page_url, args, kwargs)
+        call = (page_url, args, kwargs, call_time)
+        try:
+            result = memoize.get_stale(self, *call)
+        except KeyError:
+            pass
+        else:
+            flight, leader = memoize.join(key, threading.current_thread())
+            if leader:
+                refresh = asyncio.ensure_future(
+                    self._fly_async(key, flight, *call))
+                self._refreshes.add(refresh)
+                refresh.add_done_callback(self._refresh_done)
+            return result
+        flight, leader = memoize.join(key, threading.current_thread())
+        if not leader:
+            return await _wait_for_flight(flight)
+        return await self._fly_async(key, flight, *call)
+
+    def get_content(self, *args, **kwargs):
+        """
+        Return the content of a listing as an AsyncListing.
+
+        Takes the same parameters as Reddit.get_content.
+        """
+        return AsyncListing(self, args, kwargs)
+
+    async def request_json_async(self, page_url, params=None, url_data=None,
+                                 as_objects=True):
+        """
+        Coroutine version of request_json.
+
+        Takes the same parameters as request_json.
+        """
+        page_url += '.json'
+        response = await self._request_async(page_url, params, url_data)
+        data = self._parse_json(response, as_objects)
+        decorators.raise_api_errors(data, page_url)
+        return data
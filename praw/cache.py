@@ -0,0 +1,510 @@
+# This file is part of PRAW.
+#
+# PRAW is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# PRAW is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# PRAW.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Response cache engines.
+
+The Memoize decorator stores the responses of helpers._request in one of the
+cache engines defined here: MemoryCache, used by default, or SQLiteCache,
+used when cache_file is set in praw.ini, which persists responses across
+processes and restarts. Other engines implementing the BaseCache interface
+are used by setting them as the config.cache of a session. Every engine
+bounds the number of entries and the total size of the stored values,
+evicting the least recently used entries first, and expires timed out
+entries, each after its own timeout, oldest first so that a cache lookup
+never has to scan the whole cache. Entries are also
+indexed by URL so that evicting the results for a URL only touches the
+affected entries.
+
+Entries stored with validators (the ETag and Last-Modified headers of their
+response) or with keep_stale are not removed when they time out but become
+stale: get no longer returns them, but get_stale does, so that they can be
+revalidated with a conditional request, or served while being refreshed.
+
+Every engine guards its state with a lock of its own, so a cache can be
+shared by threads and the threads only contend when using the same engine.
+"""
+
+import json
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+
+import six
+
+
+class _Entry(object):  # pylint: disable-msg=R0903
+    """A single cached value and its position in the LRU list."""
+    __slots__ = ('key', 'value', 'size', 'timestamp', 'timeout', 'url',
+                 'validators', 'keep_stale', 'stale', 'prev', 'next')
+
+    def __init__(self, key, value, size, timestamp, timeout=None, url=None,
+                 validators=None, keep_stale=False):
+        self.key = key
+        self.value = value
+        self.size = size
+        self.timestamp = timestamp
+        self.timeout = timeout
+        self.url = url
+        self.validators = validators
+        self.keep_stale = keep_stale or bool(validators)
+        self.stale = False
+        self.prev = self.next = None
+
+
+def url_prefixes(url):
+    """
+    Return the URL and every path prefix of it, including the bare site URL.
+
+    For example http://www.reddit.com/user/bob/comments produces
+    http://www.reddit.com, http://www.reddit.com/user,
+    http://www.reddit.com/user/bob and http://www.reddit.com/user/bob/comments.
+    """
+    scheme_end = url.find('://')
+    index = url.find('/', scheme_end + 3 if scheme_end >= 0 else 0)
+    prefixes = []
+    while index >= 0:
+        prefixes.append(url[:index])
+        index = url.find('/', index + 1)
+    prefixes.append(url)
+    return prefixes
+
+
+class BaseCache(object):
+    """
+    Interface of the engines Memoize stores results in.
+
+    Results are stored under the key returned by make_key together with the
+    time they were requested, the number of seconds they may be used for and
+    the normalized URL they were requested from.
+    """
+    def __contains__(self, key):
+        raise NotImplementedError
+
+    def __iter__(self):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    @staticmethod
+    def make_key(reddit_session, url, args, kwargs):
+        """Return the key to store the result of a request under."""
+        return (reddit_session, url, repr(args),
+                frozenset(six.iteritems(kwargs)))
+
+    def clear(self):
+        """Remove every entry from the cache."""
+        raise NotImplementedError
+
+    def expire(self, now, timeout=None):
+        """
+        Expire the entries older than their timeout, or than timeout if given.
+
+        Entries kept once stale become stale, the others are removed.
+        """
+        raise NotImplementedError
+
+    def get(self, key, max_age=None):
+        """
+        Return the value for key.
+
+        Raise KeyError if key is missing, stale or, when max_age is given,
+        more than max_age seconds old.
+        """
+        raise NotImplementedError
+
+    def get_stale(self, key):
+        """
+        Return the value, validators and timestamp of key, even if stale.
+
+        Raise KeyError if key is not cached.
+        """
+        raise NotImplementedError
+
+    def remove(self, key):
+        """Remove key from the cache if it is present."""
+        raise NotImplementedError
+
+    def remove_url(self, url):
+        """Remove the entries stored for url or for any URL below it."""
+        raise NotImplementedError
+
+    def set(self, key, value, timestamp, max_entries=0, max_bytes=0,
+            url=None, validators=None, keep_stale=False, timeout=None):
+        """
+        Store value under key.
+
+        When max_entries or max_bytes (zero meaning unlimited) would be
+        exceeded the least recently used entries are evicted first. If url is
+        given the entry can later be removed with remove_url. The entry is
+        kept once stale if keep_stale is true or if validators, a dict of
+        response headers, are given. It expires timeout seconds after
+        timestamp, or only when expire is given a timeout if that is None.
+        """
+        raise NotImplementedError
+
+
+class MemoryCache(BaseCache):
+    """
+    An in-memory, size bounded LRU cache with time ordered expiry.
+
+    Entries are kept in a doubly linked list ordered from least to most
+    recently used, so lookups, insertions and LRU evictions are O(1). Entries
+    with the same timeout are also queued in insertion order, which is also
+    timestamp order, so expiring timed out entries only ever looks at the
+    oldest entries of each timeout.
+    Finally every URL prefix maps to the keys stored under it, so removing
+    the entries for a URL is proportional to the number of entries removed.
+    """
+    # Rebuild the expiry queues once they hold this many times more entries
+    # than the cache itself (entries removed early are dropped lazily).
+    COMPACT_FACTOR = 2
+
+    @staticmethod
+    def sizeof(value):
+        """Return the approximate size of value in bytes."""
+        if isinstance(value, (six.binary_type, six.text_type)):
+            return len(value)
+        return sys.getsizeof(value)
+
+    def __init__(self):
+        self._entries = self._expiry = self._root = self._urls = None
+        self._lock = threading.RLock()
+        self._queued = self.total_size = 0
+        self.clear()
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._entries))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _link(self, entry):
+        """Append entry to the most recently used end of the LRU list."""
+        last = self._root.prev
+        entry.prev, entry.next = last, self._root
+        last.next = self._root.prev = entry
+
+    @staticmethod
+    def _unlink(entry):
+        """Remove entry from the LRU list."""
+        entry.prev.next = entry.next
+        entry.next.prev = entry.prev
+        entry.prev = entry.next = None
+
+    def _compact(self):
+        """Drop the removed entries from the expiry queues."""
+        for entry_timeout, queue in list(self._expiry.items()):
+            queue = deque(x for x in queue if x.prev is not None)
+            if queue:
+                self._expiry[entry_timeout] = queue
+            else:
+                del self._expiry[entry_timeout]
+        self._queued = sum(len(x) for x in self._expiry.values())
+
+    def clear(self):
+        """Remove every entry from the cache."""
+        with self._lock:
+            self._entries = {}
+            self._expiry = {}
+            self._root = _Entry(None, None, 0, 0)
+            self._root.prev = self._root.next = self._root
+            self._urls = {}
+            self._queued = self.total_size = 0
+
+    def expire(self, now, timeout=None):
+        """
+        Expire the entries older than their timeout, or than timeout if given.
+
+        Entries kept once stale become stale, the others are removed.
+        """
+        with self._lock:
+            for entry_timeout, queue in list(self._expiry.items()):
+                limit = entry_timeout if timeout is None else timeout
+                if limit is None:
+                    continue
+                while queue and now - queue[0].timestamp > limit:
+                    entry = queue.popleft()
+                    self._queued -= 1
+                    if entry.prev is None:  # Already removed
+                        continue
+                    if entry.keep_stale:
+                        entry.stale = True
+                    else:
+                        self.remove(entry.key)
+                if not queue:
+                    del self._expiry[entry_timeout]
+
+    def get(self, key, max_age=None):
+        """Return the value for key and mark it as recently used."""
+        with self._lock:
+            entry = self._entries[key]
+            if entry.stale or (max_age is not None and
+                               time.time() - entry.timestamp > max_age):
+                raise KeyError(key)
+            self._unlink(entry)
+            self._link(entry)
+            return entry.value
+
+    def get_stale(self, key):
+        """Return the value, validators and timestamp of key, even if stale."""
+        with self._lock:
+            entry = self._entries[key]
+            return entry.value, entry.validators, entry.timestamp
+
+    def remove(self, key):
+        """Remove key from the cache if it is present."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._unlink(entry)
+                self.total_size -= entry.size
+                if entry.url is not None:
+                    for prefix in url_prefixes(entry.url):
+                        keys = self._urls[prefix]
+                        keys.discard(key)
+                        if not keys:
+                            del self._urls[prefix]
+
+    def remove_url(self, url):
+        """Remove the entries stored for url or for any URL below it."""
+        with self._lock:
+            for key in list(self._urls.get(url, ())):
+                self.remove(key)
+
+    def set(self, key, value, timestamp, max_entries=0, max_bytes=0,
+            url=None, validators=None, keep_stale=False, timeout=None):
+        """
+        Store value under key.
+
+        When max_entries or max_bytes (zero meaning unlimited) would be
+        exceeded the least recently used entries are evicted first. A value
+        larger than max_bytes on its own is not stored. If url is given the
+        entry can later be removed with remove_url. The entry is kept once
+        stale if keep_stale is true or if validators, a dict of response
+        headers, are given. It expires timeout seconds after timestamp, or
+        only when expire is given a timeout if that is None.
+        """
+        entry = _Entry(key, value, self.sizeof(value), timestamp, timeout,
+                       url, validators, keep_stale)
+        with self._lock:
+            self.remove(key)
+            if max_bytes and entry.size > max_bytes:
+                return
+            self._entries[key] = entry
+            self._link(entry)
+            if url is not None:
+                for prefix in url_prefixes(url):
+                    self._urls.setdefault(prefix, set()).add(key)
+            self._expiry.setdefault(timeout, deque()).append(entry)
+            self._queued += 1
+            self.total_size += entry.size
+            while ((max_entries and len(self._entries) > max_entries) or
+                   (max_bytes and self.total_size > max_bytes)):
+                self.remove(self._root.next.key)
+            if self._queued > self.COMPACT_FACTOR * max(len(self), 32):
+                self._compact()
+
+
+class SQLiteCache(BaseCache):
+    """
+    A persistent LRU cache stored in an SQLite database.
+
+    Values are stored zlib compressed, so any process using the same database
+    file reuses the fresh results of the others, including those of earlier
+    runs. As the reddit session itself cannot be stored, results are keyed by
+    the site's domain and the logged in user's name instead, and the modhash
+    of the session a response was sent to is removed before it is stored, so
+    that it never replaces the modhash of a later session of the same user.
+    """
+    # Version of the database layout, older databases are recreated
+    SCHEMA_VERSION = 5
+    # Number of insertions between two checks of the size limits
+    TRIM_INTERVAL = 32
+
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        version = self._db.execute('PRAGMA user_version').fetchone()[0]
+        if version != self.SCHEMA_VERSION:
+            self._db.executescript('''
+                DROP TABLE IF EXISTS responses;
+                PRAGMA user_version = %d;''' % self.SCHEMA_VERSION)
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY, url TEXT, value BLOB,
+                size INTEGER, timestamp REAL, expires REAL, accessed REAL,
+                validators TEXT, keep_stale INTEGER, stale INTEGER);
+            CREATE INDEX IF NOT EXISTS responses_url ON responses (url);
+            CREATE INDEX IF NOT EXISTS responses_timestamp
+                ON responses (timestamp);
+            CREATE INDEX IF NOT EXISTS responses_expires
+                ON responses (expires);
+            CREATE INDEX IF NOT EXISTS responses_accessed
+                ON responses (accessed);''')
+        self._insertions = 0
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._db.execute('SELECT 1 FROM responses WHERE key = ?',
+                                    (key,)).fetchone() is not None
+
+    def __iter__(self):
+        with self._lock:
+            return iter([row[0] for row in
+                         self._db.execute('SELECT key FROM responses')])
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute(
+                'SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    @staticmethod
+    def make_key(reddit_session, url, args, kwargs):
+        """Return the key to store the result of a request under."""
+        return repr((reddit_session.config.domain,
+                     six.text_type(reddit_session.user), url, repr(args),
+                     sorted(six.iteritems(kwargs))))
+
+    @staticmethod
+    def strip_modhash(value):
+        """Return a response body without the modhash of its session."""
+        if '"modhash"' not in value:
+            return value
+        try:
+            data = json.loads(value)
+        except ValueError:
+            return value
+        if (isinstance(data, dict) and isinstance(data.get('data'), dict) and
+                data['data'].pop('modhash', None) is not None):
+            return json.dumps(data)
+        return value
+
+    def _trim(self, max_entries, max_bytes):
+        """Remove the least recently used entries exceeding the limits."""
+        count, total = self._db.execute('SELECT COUNT(*), TOTAL(size) '
+                                        'FROM responses').fetchone()
+        excess_entries = max(count - max_entries, 0) if max_entries else 0
+        excess_bytes = max(total - max_bytes, 0) if max_bytes else 0
+        doomed = []
+        for key, size in self._db.execute('SELECT key, size FROM responses '
+                                          'ORDER BY accessed'):
+            if len(doomed) >= excess_entries and excess_bytes <= 0:
+                break
+            doomed.append((key,))
+            excess_bytes -= size
+        self._db.executemany('DELETE FROM responses WHERE key = ?', doomed)
+
+    def clear(self):
+        """Remove every entry from the cache."""
+        with self._lock:
+            with self._db:
+                self._db.execute('DELETE FROM responses')
+
+    def expire(self, now, timeout=None):
+        """
+        Expire the entries older than their timeout, or than timeout if given.
+
+        Entries kept once stale become stale, the others are removed.
+        """
+        if timeout is None:
+            condition, limit = 'expires < ?', now
+        else:
+            condition, limit = 'timestamp < ?', now - timeout
+        with self._lock:
+            with self._db:
+                self._db.execute('DELETE FROM responses WHERE %s '
+                                 'AND keep_stale = 0' % condition, (limit,))
+                self._db.execute('UPDATE responses SET stale = 1 '
+                                 'WHERE %s AND stale = 0' % condition,
+                                 (limit,))
+
+    def get(self, key, max_age=None):
+        """Return the value for key and mark it as recently used."""
+        with self._lock:
+            row = self._db.execute('SELECT value, timestamp FROM responses '
+                                   'WHERE key = ? AND stale = 0',
+                                   (key,)).fetchone()
+            if row is None or (max_age is not None and
+                               time.time() - row[1] > max_age):
+                raise KeyError(key)
+            with self._db:
+                self._db.execute('UPDATE responses SET accessed = ? '
+                                 'WHERE key = ?', (time.time(), key))
+        return zlib.decompress(row[0]).decode('utf-8')
+
+    def get_stale(self, key):
+        """Return the value, validators and timestamp of key, even if stale."""
+        with self._lock:
+            row = self._db.execute('SELECT value, validators, timestamp '
+                                   'FROM responses WHERE key = ?',
+                                   (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return (zlib.decompress(row[0]).decode('utf-8'),
+                json.loads(row[1]) if row[1] else None, row[2])
+
+    def remove(self, key):
+        """Remove key from the cache if it is present."""
+        with self._lock:
+            with self._db:
+                self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+
+    def remove_url(self, url):
+        """Remove the entries stored for url or for any URL below it."""
+        # Every URL below url sorts between url + '/' and url + '0'
+        with self._lock:
+            with self._db:
+                self._db.execute('DELETE FROM responses WHERE url = ? OR '
+                                 '(url >= ? AND url < ?)',
+                                 (url, url + '/', url + '0'))
+
+    def set(self, key, value, timestamp, max_entries=0, max_bytes=0,
+            url=None, validators=None, keep_stale=False, timeout=None):
+        """
+        Store value under key.
+
+        When max_entries or max_bytes (zero meaning unlimited) would be
+        exceeded the least recently used entries are evicted first. The limits
+        are checked every TRIM_INTERVAL insertions. If url is given the entry
+        can later be removed with remove_url. The entry is kept once stale if
+        keep_stale is true or if validators, a dict of response headers, are
+        given. It expires timeout seconds after timestamp, or only when
+        expire is given a timeout if that is None.
+        """
+        blob = zlib.compress(self.strip_modhash(value).encode('utf-8'))
+        if max_bytes and len(blob) > max_bytes:
+            return
+        keep_stale = int(bool(keep_stale or validators))
+        validators = json.dumps(validators) if validators else None
+        with self._lock:
+            with self._db:
+                self._db.execute('INSERT OR REPLACE INTO responses VALUES '
+                                 '(?, ?, ?, ?, ?, ?, ?, ?, ?, 0)',
+                                 (key, url, sqlite3.Binary(blob), len(blob),
+                                  timestamp, None if timeout is None else
+                                  timestamp + timeout, time.time(),
+                                  validators, keep_stale))
+                self._insertions += 1
+                if self._insertions % self.TRIM_INTERVAL == 0:
+                    self._trim(max_entries, max_bytes)
@@ -0,0 +1,107 @@
+# This file is part of PRAW.
+#
+# PRAW is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# PRAW is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# PRAW.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Checkpoints for resumable listing crawls and streams.
+
+get_content and stream_content save their position in a listing, the cursor,
+to the checkpoint they are given as every item is returned, and resume from
+the cursor it holds when they start. A cursor is a JSON serializable dict.
+MemoryCheckpoint only keeps the cursor in its cursor attribute, while
+FileCheckpoint and SQLiteCheckpoint persist it across crashes and restarts.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+
+
+class MemoryCheckpoint(object):
+    """A checkpoint holding its cursor in the cursor attribute."""
+    def __init__(self, cursor=None):
+        self.cursor = cursor
+
+    def clear(self):
+        """Forget the cursor, so that the next crawl starts over."""
+        self.cursor = None
+
+    def load(self):
+        """Return the saved cursor, or None if there is none."""
+        return self.cursor
+
+    def save(self, cursor):
+        """Save cursor."""
+        self.cursor = cursor
+
+
+class FileCheckpoint(object):
+    """A checkpoint holding its cursor in a JSON file."""
+    def __init__(self, path):
+        self.path = path
+
+    def clear(self):
+        """Forget the cursor, so that the next crawl starts over."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def load(self):
+        """Return the saved cursor, or None if there is none."""
+        try:
+            with open(self.path) as checkpoint_file:
+                return json.load(checkpoint_file)
+        except IOError:
+            return None
+
+    def save(self, cursor):
+        """Save cursor, replacing the file atomically."""
+        temporary_path = self.path + '.tmp'
+        with open(temporary_path, 'w') as checkpoint_file:
+            json.dump(cursor, checkpoint_file)
+        if os.name == 'nt' and os.path.exists(self.path):
+            os.remove(self.path)  # Windows cannot rename over a file
+        os.rename(temporary_path, self.path)
+
+
+class SQLiteCheckpoint(object):
+    """A named checkpoint in an SQLite database holding many checkpoints."""
+    def __init__(self, path, name):
+        self.path = path
+        self.name = name
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS checkpoints '
+                         '(name TEXT PRIMARY KEY, cursor TEXT)')
+        self._lock = threading.Lock()
+
+    def clear(self):
+        """Forget the cursor, so that the next crawl starts over."""
+        with self._lock:
+            with self._db:
+                self._db.execute('DELETE FROM checkpoints WHERE name = ?',
+                                 (self.name,))
+
+    def load(self):
+        """Return the saved cursor, or None if there is none."""
+        with self._lock:
+            row = self._db.execute('SELECT cursor FROM checkpoints '
+                                   'WHERE name = ?', (self.name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, cursor):
+        """Save cursor."""
+        with self._lock:
+            with self._db:
+                self._db.execute('INSERT OR REPLACE INTO checkpoints '
+                                 'VALUES (?, ?)',
+                                 (self.name, json.dumps(cursor)))
@@ -22,16 +22,88 @@ length of output strings and parse json response for certain errors.
 
 import six
 import sys
+import threading
 import time
 import warnings
+import weakref
 from functools import wraps
 from requests.compat import urljoin
 
 from praw import errors
+from praw.cache import MemoryCache, SQLiteCache
+from praw.ratelimit import FileRateLimiter, LocalRateLimiter
+
+
+class _Flight(object):
+    """
+    A call in progress, whose outcome identical calls wait for.
+
+    loop_thread is the thread of the event loop of the coroutine leading the
+    flight, if it is led by one. That thread cannot wait for the flight, as
+    the coroutine would never get to land it.
+    """
+    def __init__(self, loop_thread=None):
+        self.loop_thread = loop_thread
+        self.result = self.exc_info = None
+        self._callbacks = []
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    def add_done_callback(self, callback):
+        """Call callback with the flight once it has landed."""
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def land(self, result=None, exc_info=None):
+        """Record the outcome of the call and wake up its waiters."""
+        with self._lock:
+            self.result, self.exc_info = result, exc_info
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+    def wait(self):
+        """Return the result of the call, or raise its exception."""
+        self._done.wait()
+        if self.exc_info:
+            six.reraise(*self.exc_info)
+        return self.result
 
 
 class Memoize(object):
-    """Memoize decorator with timeout to clear cache of timed out results."""
+    """
+    Memoize decorator with timeout to clear cache of timed out results.
+
+    The results of each endpoint are kept for the number of seconds given by
+    the session's cache_timeouts setting, or for cache_timeout seconds for the
+    endpoints it does not list. Results are kept in a MemoryCache bounded by
+    the cache_max_entries and cache_max_bytes settings of the calling session,
+    or in an SQLiteCache when the session's cache_file setting names a
+    database. Any other BaseCache engine is used by setting it as the
+    session's config.cache. The engines do their own locking, so threads only
+    wait on each other while using the cache.
+
+    Calls whose result could be cached are also coalesced: while a call is in
+    flight, identical calls (those with the same cache key) wait for it and
+    share its result instead of making requests of their own. Only a call on
+    the thread of the event loop of a coroutine leading the flight, which
+    would otherwise wait forever, makes its own request.
+
+    Results are stored with the validators of their response, so once timed
+    out they are revalidated with a conditional request, and their body is
+    reused when the server answers 304 Not Modified.
+
+    Timed out results of the endpoints listed in the session's
+    cache_stale_while_revalidate setting are still returned within the given
+    number of seconds, while a background thread refreshes them.
+    """
+    VALIDATORS = (('ETag', 'If-None-Match'),
+                  ('Last-Modified', 'If-Modified-Since'))
+
     @staticmethod
     def normalize_url(url):
         """Strip trailing .json and trailing slashes."""
@@ -44,38 +116,212 @@ class Memoize(object):
     def __init__(self, function):
         wraps(function)(self)
         self.function = function
-        self._cache = {}
-        self._timeouts = {}
+        self._cache = MemoryCache()
+        self._file_caches = {}
+        self._plugged_caches = weakref.WeakSet()
+        self._flights = {}
+        self._lock = threading.Lock()
 
     def __call__(self, reddit_session, page_url, *args, **kwargs):
-        normalized_url = self.normalize_url(page_url)
-        key = (reddit_session, normalized_url, repr(args),
-               frozenset(six.iteritems(kwargs)))
         call_time = time.time()
-        self.clear_timeouts(call_time, reddit_session.config.cache_timeout)
-        self._timeouts.setdefault(key, call_time)
-        if key in self._cache:
-            return self._cache[key]
-        result = self.function(reddit_session, page_url, *args, **kwargs)
-        if kwargs.get('raw'):
+        try:
+            return self.get(reddit_session, page_url, args, kwargs, call_time)
+        except KeyError:
+            pass
+        key = self.flight_key(reddit_session, page_url, args, kwargs)
+        if key is None:
+            return self.function(reddit_session, page_url, *args, **kwargs)
+        call = (reddit_session, page_url, args, kwargs, call_time)
+        try:
+            result = self.get_stale(*call)
+        except KeyError:
+            pass
+        else:
+            flight, leader = self.join(key)
+            if leader:
+                self.refresh(key, flight, *call)
             return result
-        return self._cache.setdefault(key, result)
-
-    def clear_timeouts(self, call_time, cache_timeout):
-        """Clear the cache of timed out results."""
-        for key in list(self._timeouts):
-            if call_time - self._timeouts[key] > cache_timeout:
-                del self._timeouts[key]
-                if key in self._cache:
-                    del self._cache[key]
+        flight, leader = self.join(key)
+        if not leader:
+            if flight.loop_thread is threading.current_thread():
+                return self.function(reddit_session, page_url, *args,
+                                     **kwargs)
+            return flight.wait()
+        return self.fly(key, flight, *call)
 
     def evict(self, urls):
-        """Remove cached RedditContentObject by URL."""
-        urls = [self.normalize_url(url) for url in urls]
-        relevant_caches = [key for key in self._cache if key[1] in urls]
-        for key in relevant_caches:
-            del self._cache[key]
-            del self._timeouts[key]
+        """
+        Remove cached RedditContentObject by URL.
+
+        The results for any URL below one of the given URLs are removed as
+        well, e.g. evicting a user's page evicts all of the user's listings.
+        """
+        with self._lock:
+            caches = ([self._cache] + list(self._file_caches.values()) +
+                      list(self._plugged_caches))
+        for url in urls:
+            normalized_url = self.normalize_url(url)
+            for cache in caches:
+                cache.remove_url(normalized_url)
+
+    def flight_key(self, reddit_session, page_url, args, kwargs):
+        """Return the key to coalesce a call on, None if it is not to be."""
+        if (kwargs.get('raw') or
+                self.get_timeout(reddit_session.config, page_url) <= 0):
+            return None
+        cache = self.get_cache(reddit_session.config)
+        return (cache, cache.make_key(reddit_session,
+                                      self.normalize_url(page_url), args,
+                                      kwargs))
+
+    def fly(self, key, flight, reddit_session, page_url, args, kwargs,
+            call_time):
+        """Make the call of a flight led by the caller, and land it."""
+        try:
+            call_kwargs, stale = self.prepare(reddit_session, page_url, args,
+                                              kwargs)
+            response = self.function(reddit_session, page_url, *args,
+                                     **call_kwargs)
+            result = self.store(reddit_session, page_url, args, kwargs,
+                                response, stale, call_time)
+        except BaseException:
+            self.land(key, flight, exc_info=sys.exc_info())
+            raise
+        self.land(key, flight, result)
+        return result
+
+    def get(self, reddit_session, page_url, args, kwargs, now):
+        """Return the cached result of a call, raising KeyError if missing."""
+        config = reddit_session.config
+        cache = self.get_cache(config)
+        key = cache.make_key(reddit_session, self.normalize_url(page_url),
+                             args, kwargs)
+        cache.expire(now)
+        return cache.get(key, self.get_timeout(config, page_url))
+
+    @staticmethod
+    def get_timeout(config, page_url):
+        """Return the number of seconds to cache page_url's results for."""
+        if config.cache_timeouts:
+            endpoint = config.endpoint(page_url)
+            if endpoint in config.cache_timeouts:
+                return config.cache_timeouts[endpoint]
+        return config.cache_timeout
+
+    def get_stale(self, reddit_session, page_url, args, kwargs, now):
+        """
+        Return a timed out result within its stale-while-revalidate window.
+
+        Raise KeyError if there is no such result.
+        """
+        config = reddit_session.config
+        window = self.stale_window(config, page_url)
+        cache = self.get_cache(config)
+        key = cache.make_key(reddit_session, self.normalize_url(page_url),
+                             args, kwargs)
+        if window > 0:
+            value, _, timestamp = cache.get_stale(key)
+            if now - timestamp <= self.get_timeout(config, page_url) + window:
+                return value
+        raise KeyError(key)
+
+    def join(self, key, loop_thread=None):
+        """
+        Join the flight of the call with the given flight_key.
+
+        Return the flight and whether the caller is its leader, i.e. is to
+        make the call itself and land the flight with its outcome. A coroutine
+        joining gives the thread of its event loop as loop_thread.
+        """
+        with self._lock:
+            if key in self._flights:
+                return self._flights[key], False
+            flight = self._flights[key] = _Flight(loop_thread)
+            return flight, True
+
+    def land(self, key, flight, result=None, exc_info=None):
+        """Land the flight led by the caller once its result is cached."""
+        with self._lock:
+            del self._flights[key]
+        flight.land(result, exc_info)
+
+    def prepare(self, reddit_session, page_url, args, kwargs):
+        """
+        Prepare a cacheable call that missed the cache.
+
+        Return the keyword arguments to make the call with, so that it returns
+        the response object and revalidates the stale result of the call if
+        there is one, and that stale result.
+        """
+        cache = self.get_cache(reddit_session.config)
+        key = cache.make_key(reddit_session, self.normalize_url(page_url),
+                             args, kwargs)
+        call_kwargs = dict(kwargs, raw=True)
+        try:
+            stale = cache.get_stale(key)
+        except KeyError:
+            return call_kwargs, None
+        if stale[1]:
+            call_kwargs['headers'] = dict(
+                (request_header, stale[1][header]) for header, request_header
+                in self.VALIDATORS if header in stale[1])
+        return call_kwargs, stale
+
+    def refresh(self, key, flight, *call):
+        """Make the call of a flight led by the caller in a new thread."""
+        def fly():
+            """Make the call, leaving any error to the flight's waiters."""
+            try:
+                self.fly(key, flight, *call)
+            except Exception:  # pylint: disable-msg=W0703
+                pass
+        thread = threading.Thread(target=fly)
+        thread.daemon = True
+        thread.start()
+
+    @staticmethod
+    def stale_window(config, page_url):
+        """Return the stale-while-revalidate window of page_url's endpoint."""
+        if not config.cache_stale_while_revalidate:
+            return 0
+        return config.cache_stale_while_revalidate.get(
+            config.endpoint(page_url), 0)
+
+    def store(self, reddit_session, page_url, args, kwargs, response, stale,
+              call_time):
+        """Cache the response to a prepared call and return its body."""
+        config = reddit_session.config
+        if response.status_code == 304 and stale:
+            result = stale[0]
+            validators = dict(stale[1] or {})
+        else:
+            result = response.text
+            validators = {}
+        for header, _ in self.VALIDATORS:
+            if header in response.headers:
+                validators[header] = response.headers[header]
+        normalized_url = self.normalize_url(page_url)
+        cache = self.get_cache(config)
+        key = cache.make_key(reddit_session, normalized_url, args, kwargs)
+        cache.set(key, result, call_time, config.cache_max_entries,
+                  config.cache_max_bytes, normalized_url, validators or None,
+                  self.stale_window(config, page_url) > 0,
+                  self.get_timeout(config, page_url))
+        return result
+
+    def get_cache(self, config):
+        """Return the cache engine to use for the given site config."""
+        if config.cache is not None:
+            with self._lock:
+                self._plugged_caches.add(config.cache)
+            return config.cache
+        if not config.cache_file:
+            return self._cache
+        with self._lock:
+            if config.cache_file not in self._file_caches:
+                self._file_caches[config.cache_file] = SQLiteCache(
+                    config.cache_file)
+            return self._file_caches[config.cache_file]
 
 
 class RequireCaptcha(object):
@@ -124,27 +370,57 @@ class SleepAfter(object):  # pylint: disable-msg=R0903
     specified in praw.ini. This value may differ from reddit to reddit. For
     reddit.com it is 2. Any function decorated with this will be forced to
     delay api_request_delay seconds from the calling of the last function
-    decorated with this before executing.
+    decorated with this before executing, except that up to
+    api_request_burst calls may be made at once after an idle period. Every
+    logged in account has a budget of its own, while anonymous sessions share
+    the budget of their site. When rate_limit_file is set in praw.ini the
+    budgets are shared with every process using the same file. Threads share
+    the schedule of their process but sleep without holding any lock.
     """
     def __init__(self, function):
         wraps(function)(self)
         self.function = function
-        self.last_call = {}
+        self._limiter = LocalRateLimiter()
+        self._file_limiters = {}
+        self._lock = threading.Lock()
 
     def __call__(self, *args, **kwargs):
-        config = args[0].config
-        if config.domain in self.last_call:
-            last_call = self.last_call[config.domain]
-        else:
-            last_call = 0
-        now = time.time()
-        delay = last_call + int(config.api_request_delay) - now
+        delay = self.reserve(args[0])
         if delay > 0:
-            now += delay
             time.sleep(delay)
-        self.last_call[config.domain] = now
         return self.function(*args, **kwargs)
 
+    @staticmethod
+    def get_key(reddit_session):
+        """Return the key of the rate budget used by reddit_session."""
+        if reddit_session.user is None:
+            return reddit_session.config.domain
+        return '%s/%s' % (reddit_session.config.domain,
+                          reddit_session.user.name)
+
+    def reserve(self, reddit_session):
+        """
+        Reserve the next request slot for reddit_session.
+
+        Return the number of seconds to wait before making the request.
+        """
+        config = reddit_session.config
+        limiter = self.get_limiter(config)
+        slot = limiter.reserve(self.get_key(reddit_session),
+                               config.api_request_delay,
+                               config.api_request_burst)
+        return slot - time.time()
+
+    def get_limiter(self, config):
+        """Return the rate limiter to use for the given site config."""
+        if not config.rate_limit_file:
+            return self._limiter
+        with self._lock:
+            if config.rate_limit_file not in self._file_limiters:
+                self._file_limiters[config.rate_limit_file] = FileRateLimiter(
+                    config.rate_limit_file)
+            return self._file_limiters[config.rate_limit_file]
+
 
 def limit_chars(num_chars=80):
     """Limit the number of chars in a function that outputs a string."""
@@ -159,37 +435,42 @@ def limit_chars(num_chars=80):
     return function_limiter
 
 
-def parse_api_json_response(function):  # pylint: disable-msg=R0912
+def parse_api_json_response(function):
     """Raise client side exception(s) if errors in the API request response."""
     @wraps(function)
     def error_checked_function(self, *args, **kwargs):
         return_value = function(self, *args, **kwargs)
-        allowed = ('captcha', 'data', 'errors', 'kind', 'names', 'next',
-                   'prev', 'ratelimit', 'users')
-        if isinstance(return_value, dict):
-            for key in return_value:
-                if key not in allowed:
-                    warnings.warn_explicit('Unknown return key: %s' % key,
-                                           UserWarning, '', 0)
-            if 'errors' in return_value and return_value['errors']:
-                error_list = []
-                for error_type, msg, value in return_value['errors']:
-                    if error_type in errors.ERROR_MAPPING:
-                        if error_type == 'RATELIMIT':
-                            _request.evict(args[0])
-                        error_class = errors.ERROR_MAPPING[error_type]
-                    else:
-                        error_class = errors.APIException
-                    error_list.append(error_class(error_type, msg, value,
-                                                  return_value))
-                if len(error_list) == 1:
-                    raise error_list[0]
-                else:
-                    raise errors.ExceptionList(error_list)
+        raise_api_errors(return_value, args[0])
         return return_value
     return error_checked_function
 
 
+def raise_api_errors(response, page_url):
+    """Raise client side exception(s) if errors in the API response."""
+    allowed = ('captcha', 'data', 'errors', 'kind', 'names', 'next', 'prev',
+               'ratelimit', 'users')
+    if not isinstance(response, dict):
+        return
+    for key in response:
+        if key not in allowed:
+            warnings.warn_explicit('Unknown return key: %s' % key,
+                                   UserWarning, '', 0)
+    if 'errors' in response and response['errors']:
+        error_list = []
+        for error_type, msg, value in response['errors']:
+            if error_type in errors.ERROR_MAPPING:
+                if error_type == 'RATELIMIT':
+                    _request.evict([page_url])
+                error_class = errors.ERROR_MAPPING[error_type]
+            else:
+                error_class = errors.APIException
+            error_list.append(error_class(error_type, msg, value, response))
+        if len(error_list) == 1:
+            raise error_list[0]
+        else:
+            raise errors.ExceptionList(error_list)
+
+
 def require_login(function):
     """Ensure the user has logged in."""
     @wraps(function)
@@ -14,11 +14,26 @@
 
 """Helper functions"""
 
+import codecs
+import itertools
+import json
+import re
+import requests
 import sys
 import six
+import threading
 from requests.compat import urljoin
 from praw.decorators import Memoize, SleepAfter, require_login
 
+# The JSON libraries tried, fastest first, when json_backend is not set
+JSON_BACKENDS = ('ujson', 'simplejson', 'json')
+_JSON_LOADS = {}
+# requests 1.0 renamed the prefetch argument of requests to stream, inverted
+if int(requests.__version__.split('.')[0]) >= 1:
+    _STREAM_ARGUMENTS = {'stream': True}
+else:
+    _STREAM_ARGUMENTS = {'prefetch': False}
+
 
 def _get_section(subpath=''):
     """Generate sections overview, comments and submitted for Redditor class"""
@@ -48,6 +63,303 @@ def _get_sorter(subpath='', **defaults):
     return _sorted
 
 
+class _JSONStream(object):
+    """
+    Decode the things of a streamed JSON response as they arrive.
+
+    Iterating yields the things of the list found at path, e.g. ('data',
+    'children') for a listing, each decoded and passed through convert as soon
+    as it is complete. Only the undecoded part of the body is kept in memory.
+    Once the iteration is over, root holds the rest of the response, passed
+    through convert too, with an empty list in place of the things, and
+    callback, if any, has been called with it.
+    """
+    CHUNK_SIZE = 16384
+    WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+    def __init__(self, response, path, convert=None, callback=None):
+        self.root = None
+        self._response = response
+        self._chunks = response.iter_content(self.CHUNK_SIZE)
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._decoder = json.JSONDecoder()
+        self._convert = convert or (lambda data: data)
+        self._path = tuple(path)
+        self._callback = callback
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def __iter__(self):
+        decoded = []
+        try:
+            for thing in self._walk(self._path, decoded):
+                yield self._convert(thing)
+        finally:
+            # Responses of requests before 1.0 cannot be closed
+            if hasattr(self._response, 'close'):
+                self._response.close()
+        self.root = self._convert(decoded[0])
+        if self._callback:
+            self._callback(self.root)
+
+    def _expect(self, *chars):
+        """Consume the next character, which must be one of chars."""
+        char = self._peek()
+        if char not in chars:
+            raise ValueError('Expecting %s at %d, found %r'
+                             % (' or '.join(chars), self._pos, char))
+        self._pos += 1
+        return char
+
+    def _peek(self):
+        """Skip whitespace and return the next character."""
+        while True:
+            self._pos = self.WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._read(1):
+                raise ValueError('Unexpected end of JSON data')
+
+    def _read(self, size):
+        """Buffer size characters past the position, if there are as many."""
+        while len(self._buffer) - self._pos < size and not self._eof:
+            try:
+                text = self._utf8.decode(six.next(self._chunks))
+            except StopIteration:
+                text = self._utf8.decode(b'', True)
+                self._eof = True
+            # Drop the decoded part of the buffer
+            self._buffer = self._buffer[self._pos:] + text
+            self._pos = 0
+        return len(self._buffer) - self._pos >= size
+
+    def _value(self):
+        """Decode the next value."""
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer,
+                                                      idx=self._pos)
+            except ValueError:
+                if self._eof:
+                    raise
+            else:
+                # A number at the end of the buffer may not be complete
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            # Read at least as much again, so that a long value is not decoded
+            # once per chunk
+            self._read(2 * (len(self._buffer) - self._pos))
+
+    def _walk(self, path, decoded):
+        """Yield the things at path within the next value, then decode it."""
+        if not path:
+            self._expect('[')
+            if self._peek() == ']':
+                self._pos += 1
+            else:
+                while True:
+                    yield self._value()
+                    if self._expect(',', ']') == ']':
+                        break
+            decoded.append([])
+            return
+        char = self._peek()
+        if char == '{':
+            self._pos += 1
+            value = {}
+            if self._peek() == '}':
+                self._pos += 1
+            else:
+                while True:
+                    key = self._value()
+                    self._expect(':')
+                    if key == path[0]:
+                        inner = []
+                        for thing in self._walk(path[1:], inner):
+                            yield thing
+                        value[key] = inner[0]
+                    else:
+                        value[key] = self._value()
+                    if self._expect(',', '}') == '}':
+                        break
+        elif char == '[':
+            self._pos += 1
+            value = []
+            if self._peek() == ']':
+                self._pos += 1
+            else:
+                while True:
+                    if len(value) == path[0]:
+                        inner = []
+                        for thing in self._walk(path[1:], inner):
+                            yield thing
+                        value.append(inner[0])
+                    else:
+                        value.append(self._value())
+                    if self._expect(',', ']') == ']':
+                        break
+        else:
+            value = self._value()
+        decoded.append(value)
+
+
+def _get_json_loads(name=None):
+    """
+    Return the loads function of the JSON library named name.
+
+    Any module with a json compatible loads function can be named. Without a
+    name, return that of the first of JSON_BACKENDS which is installed.
+    """
+    if name not in _JSON_LOADS:
+        for module_name in (name,) if name else JSON_BACKENDS:
+            try:
+                module = __import__(module_name, fromlist=['loads'])
+            except ImportError:
+                if name:
+                    raise
+            else:
+                _JSON_LOADS[name] = module.loads
+                break
+    return _JSON_LOADS[name]
+
+
+class _ListingPager(object):
+    """
+    The page bookkeeping of a listing, shared by the listing generators.
+
+    page_url_data tells which page to request next, entries yields the entries
+    of a page that are to be returned and end_page moves on to the next page.
+    The position in the listing is saved to checkpoint, if any, as entries
+    are returned, and a pager given the checkpoint of an interrupted listing
+    resumes with the entry after the last one returned.
+    """
+    def __init__(self, reddit_session, limit, url_data, place_holder,
+                 checkpoint):
+        self.reddit_session = reddit_session
+        if limit is not None and limit <= 0:
+            limit = int(reddit_session.config.default_content_limit)
+        self.limit = limit
+        self.url_data = {} if url_data is None else url_data
+        self.place_holder = place_holder
+        self.checkpoint = checkpoint
+        self.found = 0
+        self.done = False
+        self._skip = 0
+        self._page_after = None
+        cursor = checkpoint.load() if checkpoint is not None else None
+        if cursor:
+            self.done = cursor['done']
+            self.found = cursor['found']
+            self._skip = cursor['offset']
+            if cursor['after']:
+                self.url_data['after'] = cursor['after']
+
+    def _remaining(self, found):
+        """Return the number of entries left after found, None if unlimited."""
+        return None if self.limit is None else self.limit - found
+
+    def _save(self, after, offset, done):
+        """Save the position in the listing to the checkpoint, if any."""
+        if self.checkpoint is not None:
+            self.checkpoint.save({'after': after, 'offset': offset,
+                                  'found': self.found, 'done': bool(done)})
+
+    def end_page(self, after):
+        """Move on to the page after the current one, if there is one."""
+        if self.done:
+            return
+        self._skip = 0
+        if after:
+            self.url_data['after'] = after
+            self._save(after, 0, False)
+        else:
+            self.done = True
+            self._save(self._page_after, 0, True)
+
+    def entries(self, things, page_size=None, after=None):
+        """
+        Yield the things of the current page that are to be returned.
+
+        page_size and after are those of the page, None if they are not known
+        until its things have been consumed.
+        """
+        things = itertools.islice(things, self._skip, None)
+        for offset, thing in enumerate(things, self._skip + 1):
+            self.found += 1
+            # Terminate when we've reached the limit, or place holder
+            done = (self.found == self.limit or
+                    self.place_holder and thing.id == self.place_holder or
+                    offset == page_size and not after)
+            if offset == page_size:  # Resume with the next page
+                self._save(after, 0, done)
+            else:
+                self._save(self._page_after, offset, done)
+            yield thing
+            if done:
+                self.done = True
+                return
+
+    def next_page_url_data(self, after, page_size):
+        """
+        Return the GET data of the page after the current one.
+
+        Return None if that page is not needed, e.g. as the current page holds
+        the remaining entries.
+        """
+        # pylint: disable-msg=W0212
+        page_found = self.found + page_size - self._skip
+        remaining = self._remaining(page_found)
+        if not after or remaining is not None and remaining <= 0:
+            return None
+        url_data = self.reddit_session._get_page_url_data(self.url_data,
+                                                          remaining)
+        url_data['after'] = after
+        return url_data
+
+    def page_url_data(self):
+        """
+        Return the GET data of the current page.
+
+        Return None once the listing is done.
+        """
+        # pylint: disable-msg=W0212
+        remaining = self._remaining(self.found)
+        if self.done or remaining is not None and remaining <= 0:
+            return None
+        self._page_after = self.url_data.get('after')
+        # The entries skipped when resuming are requested again, so that the
+        # page is the one the checkpoint was saved from
+        return self.reddit_session._get_page_url_data(
+            self.url_data, None if remaining is None else
+            remaining + self._skip)
+
+
+class _Prefetcher(object):
+    """Call a function in a background thread and hand over its result."""
+    def __init__(self, function, *args, **kwargs):
+        self._result = self._exc_info = None
+        self._thread = threading.Thread(target=self._run,
+                                        args=(function, args, kwargs))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self, function, args, kwargs):
+        try:
+            self._result = function(*args, **kwargs)
+        except Exception:  # pylint: disable-msg=W0703
+            self._exc_info = sys.exc_info()
+
+    def result(self):
+        """Wait for the call to finish, then return or raise its outcome."""
+        self._thread.join()
+        if self._exc_info:
+            six.reraise(*self._exc_info)
+        return self._result
+
+
 def _modify_relationship(relationship, unlink=False, is_sub=False):
     """
     Modify relationship.
@@ -74,8 +386,14 @@ def _modify_relationship(relationship, unlink=False, is_sub=False):
 @Memoize
 @SleepAfter
 def _request(reddit_session, page_url, params=None, data=None, timeout=45,
-             raw=False):
-    """Make the http request and return the http response body."""
+             raw=False, headers=None, stream=False):
+    """
+    Make the http request and return the http response body.
+
+    When raw is True return the response object instead. headers are sent in
+    addition to the session's own. When stream is True the body is only
+    downloaded as the response object is read.
+    """
     if reddit_session.config.log_requests >= 1:
         sys.stderr.write('retrieving: %s\n' % page_url)
     if reddit_session.config.log_requests >= 2:
@@ -91,8 +409,9 @@ def _request(reddit_session, page_url, params=None, data=None, timeout=45,
         method = reddit_session.http.post
     else:
         method = reddit_session.http.get
+    kwargs = _STREAM_ARGUMENTS if stream else {}
     response = method(page_url, params=params, data=data, timeout=timeout,
-                      headers=reddit_session.DEFAULT_HEADERS)
+                      headers=headers, **kwargs)
     response.raise_for_status()
     if raw:
         return response
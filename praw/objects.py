@@ -22,8 +22,11 @@ extends over multiple Things. An object that extends from Saveable indicates
 that it can be saved and unsaved in the context of a logged in user.
 """
 
+import heapq
 import six
+import threading
 import warnings
+from collections import deque
 
 from requests.compat import urljoin
 from praw.decorators import limit_chars, require_login
@@ -33,6 +36,21 @@ from praw.helpers import (_get_section, _get_sorter, _modify_relationship,
 
 
 REDDITOR_KEYS = ('approved_by', 'author', 'banned_by', 'redditor')
+# The attribute names of compact objects, by class, mapped to the index of
+# their value in the objects' _values lists
+_KEY_TABLES = {}
+_KEY_TABLES_LOCK = threading.Lock()
+_MISSING = object()
+
+
+def _key_index(cls, name):
+    """Return the index of attribute name of compact cls objects."""
+    try:
+        return _KEY_TABLES[cls][name]
+    except KeyError:
+        with _KEY_TABLES_LOCK:
+            table = _KEY_TABLES.setdefault(cls, {})
+            return table.setdefault(name, len(table))
 
 
 class RedditContentObject(object):
@@ -63,6 +81,23 @@ class RedditContentObject(object):
                 self.content_id == other.content_id)
 
     def __getattr__(self, attr):
+        values = self.__dict__.get('_values')
+        if values is not None:
+            index = _KEY_TABLES.get(type(self), {}).get(attr)
+            if index is not None and index < len(values):
+                value = values[index]
+                if value is not _MISSING:
+                    if value and isinstance(value, six.string_types) and (
+                            attr == 'subreddit' or attr in REDDITOR_KEYS):
+                        setattr(self, attr, value)  # Convert once
+                        value = values[index]
+                    return value
+        lazy = self.__dict__.get('_lazy')
+        if lazy is not None and attr in lazy:
+            setattr(self, attr, lazy[attr])
+            lazy.pop(attr, None)
+        if attr in self.__dict__:  # Converted, possibly by another thread
+            return self.__dict__[attr]
         if not self._populated:
             self._populated = self._populate(None, True)
             return getattr(self, attr)
@@ -73,15 +108,24 @@ class RedditContentObject(object):
         return not (self == other)
 
     def __setattr__(self, name, value):
+        # pylint: disable-msg=W0212
         if value and name == 'subreddit':
-            value = Subreddit(self.reddit_session, value, fetch=False)
+            value = self.reddit_session._get_flyweight(Subreddit, value)
         elif value and name in REDDITOR_KEYS:
             if isinstance(value, bool):
                 pass
             elif not value or value == '[deleted]':
                 value = None
             else:
-                value = Redditor(self.reddit_session, value, fetch=False)
+                value = self.reddit_session._get_flyweight(Redditor, value)
+        values = self.__dict__.get('_values')
+        if values is not None:
+            index = _KEY_TABLES.get(type(self), {}).get(name)
+            if index is not None:
+                if index >= len(values):
+                    values.extend([_MISSING] * (index + 1 - len(values)))
+                values[index] = value
+                return
         object.__setattr__(self, name, value)
 
     def __str__(self):
@@ -101,12 +145,59 @@ class RedditContentObject(object):
                 json_dict = self._get_json_dict()
             else:
                 json_dict = {}
+        if self.reddit_session.config.compact_objects:
+            self._populate_compactly(json_dict)
+            return bool(json_dict) or fetch
+        if self.reddit_session.config.lazy_objects:
+            self._populate_lazily(json_dict)
+            return bool(json_dict) or fetch
         for name, value in six.iteritems(json_dict):
             if self._underscore_names and name in self._underscore_names:
                 name = '_' + name
             setattr(self, name, value)
         return bool(json_dict) or fetch
 
+    def _populate_compactly(self, json_dict):
+        """
+        Set the attributes of json_dict in the _values list of the object.
+
+        The names are kept once per class rather than in every object's
+        __dict__. Like lazy_objects, the Redditor and Subreddit objects of
+        e.g. author and subreddit are only created when first read.
+        """
+        values = self.__dict__.get('_values')
+        if values is None:
+            values = [_MISSING] * len(_KEY_TABLES.get(type(self), ()))
+            self.__dict__['_values'] = values
+        for name, value in six.iteritems(json_dict):
+            if self._underscore_names and name in self._underscore_names:
+                name = '_' + name
+            index = _key_index(type(self), name)
+            if index >= len(values):
+                values.extend([_MISSING] * (index + 1 - len(values)))
+            self.__dict__.pop(name, None)  # Replace rather than shadow
+            values[index] = value
+
+    def _populate_lazily(self, json_dict):
+        """
+        Keep json_dict to set the attributes from when they are first read.
+
+        Setting an attribute is what creates the Redditor and Subreddit
+        objects of e.g. author and subreddit, so the attributes that are
+        never read cost nothing.
+        """
+        lazy = self.__dict__.get('_lazy')
+        if lazy is None and not self._underscore_names:
+            self.__dict__['_lazy'] = json_dict
+            return
+        if lazy is None:
+            lazy = self.__dict__['_lazy'] = {}
+        for name, value in six.iteritems(json_dict):
+            if self._underscore_names and name in self._underscore_names:
+                name = '_' + name
+            self.__dict__.pop(name, None)  # Replace rather than shadow
+            lazy[name] = value
+
     @property
     def content_id(self):
         """
@@ -150,8 +241,9 @@ class Deletable(RedditContentObject):
         url = self.reddit_session.config['del']
         params = {'id': self.content_id}
         response = self.reddit_session.request_json(url, params)
-        # pylint: disable-msg=E1101
-        _request.evict([self.reddit_session.config['user']])
+        if self.reddit_session.user:
+            # pylint: disable-msg=E1101,W0212
+            _request.evict([self.reddit_session.user._url])
         return response
 
 
@@ -180,8 +272,9 @@ class Editable(RedditContentObject):
         params = {'thing_id': self.content_id,
                   'text': text}
         response = self.reddit_session.request_json(url, params)
-        # pylint: disable-msg=E1101
-        _request.evict([self.reddit_session.config['user']])
+        if self.reddit_session.user:
+            # pylint: disable-msg=E1101,W0212
+            _request.evict([self.reddit_session.user._url])
         # REDDIT: reddit's end should only ever return a single comment
         return response['data']['things'][0]
 
@@ -289,9 +382,8 @@ class Reportable(RedditContentObject):
         params = {'id': self.content_id}
         response = self.reddit_session.request_json(url, params)
         # Reported objects are automatically hidden as well
-        # pylint: disable-msg=E1101
-        _request.evict([self.reddit_session.config['user'],
-                        urljoin(self.reddit_session.user._url, 'hidden')])
+        # pylint: disable-msg=E1101,W0212
+        _request.evict([self.reddit_session.user._url])
         return response
 
 
@@ -443,14 +535,7 @@ class MoreComments(RedditContentObject):
                         not in self.submission._comments_by_id]
             if not children:
                 return None
-            params = {'children': ','.join(children),
-                      'link_id': self.submission.content_id,
-                      'r': str(self.submission.subreddit)}
-            if self.reddit_session.config.comment_sort:
-                params['where'] = self.reddit_session.config.comment_sort
-            url = self.reddit_session.config['morechildren']
-            response = self.reddit_session.request_json(url, params)
-            self._comments = response['data']['things']
+            self._comments = self.submission._get_more_children(children)
             if update:
                 for comment in self._comments:
                     # pylint: disable-msg=W0212
@@ -458,6 +543,45 @@ class MoreComments(RedditContentObject):
         return self._comments
 
 
+class _MoreCommentsQueue(object):
+    """
+    The MoreComments objects waiting to be expanded.
+
+    Without a key objects are expanded in tree order, except that objects
+    discovered while expanding are expanded first. With a key objects are
+    expanded in order of their key, ties broken by insertion order.
+    """
+    def __init__(self, key=None):
+        self._key = key
+        self._items = deque() if key is None else []
+        self._count = 0
+
+    def __iter__(self):
+        if self._key is None:
+            return iter(list(self._items))
+        return iter([item[-1] for item in sorted(self._items)])
+
+    def __len__(self):
+        return len(self._items)
+
+    def pop(self):
+        """Remove and return the next object to expand."""
+        if self._key is None:
+            return self._items.popleft()
+        return heapq.heappop(self._items)[-1]
+
+    def push(self, more, discovered=False):
+        """Add an object, discovered while expanding or not, to the queue."""
+        if self._key is None:
+            if discovered:
+                self._items.appendleft(more)
+            else:
+                self._items.append(more)
+        else:
+            self._count += 1
+            heapq.heappush(self._items, (self._key(more), self._count, more))
+
+
 class Redditor(Messageable, Refreshable):
     """A class representing the users of reddit."""
     get_overview = _get_section('')
@@ -589,7 +713,16 @@ class Submission(Approvable, Deletable, Distinguishable, Editable, Hideable,
             url_data['limit'] = comment_limit
         if comment_sort:
             url_data['sort'] = comment_sort
-        s_info, c_info = reddit_session.request_json(url, url_data=url_data)
+        if reddit_session.config.stream_json:
+            # pylint: disable-msg=W0212
+            stream = reddit_session._request_json_stream(
+                url, (1, 'data', 'children'), url_data)
+            comments = list(stream)
+            s_info, c_info = stream.root
+            c_info['data']['children'] = comments
+        else:
+            s_info, c_info = reddit_session.request_json(url,
+                                                         url_data=url_data)
         if comments_only:
             return c_info['data']['children']
         submission = s_info['data']['children'][0]
@@ -631,54 +764,115 @@ class Submission(Approvable, Deletable, Distinguishable, Editable, Hideable,
             else:
                 self._orphaned[comment.parent_id] = [comment]
 
-    def _replace_more_comments(self):
-        """Replace MoreComments objects with the actual comments."""
-        queue = [(None, x) for x in self.comments]
-        remaining = self.reddit_session.config.more_comments_max
-        if remaining < 0:
-            remaining = None
-        skipped = []
+    def _get_more_children(self, children):
+        """Return the things for a list of comment ids of this submission."""
+        params = {'children': ','.join(children),
+                  'link_id': self.content_id,
+                  'r': str(self.subreddit)}
+        if self.reddit_session.config.comment_sort:
+            params['where'] = self.reddit_session.config.comment_sort
+        url = self.reddit_session.config['morechildren']
+        response = self.reddit_session.request_json(url, params)
+        return response['data']['things']
+
+    def _comment_depth(self, parent_id):
+        """Return the depth of a comment with the given parent_id."""
+        depth = 0
+        while parent_id in self._comments_by_id:
+            depth += 1
+            parent_id = self._comments_by_id[parent_id].parent_id
+        return depth
 
-        while len(queue) > 0:
-            parent, comm = queue.pop(0)
+    def _replace_more_comments(self, limit=None, order=None):
+        """
+        Replace MoreComments objects with the actual comments.
+
+        The children of several MoreComments objects are requested together,
+        up to more_children_max at a time, and each returned comment is
+        inserted below its parent. Return the list of MoreComments objects
+        that were skipped after limit requests.
+        """
+        if limit is None:
+            limit = self.reddit_session.config.more_comments_max
+        remaining = limit if limit >= 0 else None
+        if order is None:
+            order = self.reddit_session.config.more_comments_order
+        if order == 'largest':
+            def key(more):
+                """Expand the objects hiding the most comments first."""
+                return -more.count
+        elif order == 'shallowest':
+            def key(more):
+                """Expand the objects closest to the top level first."""
+                return self._comment_depth(more.parent_id)
+        elif callable(order) or not order:
+            key = order or None
+        else:
+            raise ClientException('Invalid more comments order: %r' % order)
+        # A batch must hold at least one comment for the loop to progress
+        batch_size = max(1, self.reddit_session.config.more_children_max)
+        # The lists MoreComments objects are removed from, by id. Each list is
+        # filtered once at the end rather than on every removal.
+        containers = {}
+        more_queue = _MoreCommentsQueue(key)
+
+        queue = deque((None, x) for x in self.comments)
+        while queue:
+            parent, comm = queue.popleft()
             if isinstance(comm, MoreComments):
-                if parent:
-                    parent.replies.remove(comm)
-                elif parent is None:
-                    self._comments.remove(comm)
-
-                # Skip after reaching the limit
-                if remaining is not None and remaining <= 0:
-                    skipped.append(comm)
-                    continue
-
-                new_comments = comm.comments(update=False)
-
-                # Don't count if no request was made
-                if new_comments is None:
-                    continue
-                elif remaining is not None:
-                    remaining -= 1
-
-                for comment in new_comments:
-                    if isinstance(comment, MoreComments):
-                        # pylint: disable-msg=W0212
-                        comment._update_submission(self)
-                        queue.insert(0, (0, comment))
-                    else:
-                        # pylint: disable-msg=W0212
-                        assert not comment._replies
-                        # Replies needs to be an empty list
-                        comment._replies = []
-                        self._insert_comment(comment)
+                container = parent.replies if parent else self._comments
+                containers[id(container)] = container
+                more_queue.push(comm)
             else:
-                for item in comm.replies:
-                    queue.append((comm, item))
+                queue.extend((comm, item) for item in comm.replies)
+
+        pending = []  # (comment id, MoreComments object) pairs
+        requested = set()
+        skipped = []
+        while more_queue or pending:
+            while more_queue and len(pending) < batch_size:
+                more = more_queue.pop()
+                # pylint: disable-msg=W0212
+                for child in more.children:
+                    if (child not in requested and
+                            't1_%s' % child not in self._comments_by_id):
+                        requested.add(child)
+                        pending.append((child, more))
+            if not pending:
+                continue
+
+            # Skip after reaching the limit
+            if remaining is not None and remaining <= 0:
+                for _, more in pending:
+                    if not skipped or skipped[-1] is not more:
+                        skipped.append(more)
+                skipped.extend(more_queue)
+                break
+            elif remaining is not None:
+                remaining -= 1
+
+            batch, pending = pending[:batch_size], pending[batch_size:]
+            for comment in self._get_more_children([x for x, _ in batch]):
+                if isinstance(comment, MoreComments):
+                    # pylint: disable-msg=W0212
+                    comment._update_submission(self)
+                    more_queue.push(comment, discovered=True)
+                else:
+                    # pylint: disable-msg=W0212
+                    assert not comment._replies
+                    # Replies needs to be an empty list
+                    comment._replies = []
+                    self._insert_comment(comment)
+
+        for container in containers.values():
+            container[:] = [x for x in container
+                            if not isinstance(x, MoreComments)]
 
         if skipped:
             warnings.warn_explicit('Skipped %d more comments objects on %r' %
                                    (len(skipped), six.text_type(self)),
                                    UserWarning, '', 0)
+        return skipped
 
     def _update_comments(self, comments):
         self._comments = comments
@@ -702,9 +896,7 @@ class Submission(Approvable, Deletable, Distinguishable, Editable, Hideable,
         requests may be needed to get all comments.
         """
         if not self._all_comments:
-            self._replace_more_comments()
-            self._all_comments = True
-            self._comments_flat = None
+            self.replace_more_comments()
         return self._comments
 
     @property
@@ -751,16 +943,44 @@ class Submission(Approvable, Deletable, Distinguishable, Editable, Hideable,
         instead.
         """
         if not self._comments_flat:
-            stack = self.comments[:]
-            self._comments_flat = []
-            while len(stack) > 0:
-                comment = stack.pop(0)
-                assert(comment not in self._comments_flat)
-                if isinstance(comment, Comment):
-                    stack[0:0] = comment.replies
-                self._comments_flat.append(comment)
+            self._comments_flat = list(self.iter_comments_flat())
         return self._comments_flat
 
+    def iter_comments_flat(self):
+        """
+        Return a generator of comments in the same order as comments_flat.
+
+        Unlike comments_flat, the comments are yielded as the forest is walked
+        rather than collected into a list first.
+        """
+        seen = set()
+        stack = self.comments[::-1]
+        while stack:
+            comment = stack.pop()
+            assert id(comment) not in seen
+            seen.add(id(comment))
+            if isinstance(comment, Comment):
+                stack.extend(reversed(comment.replies))
+            yield comment
+
+    def replace_more_comments(self, limit=None, order=None):
+        """
+        Replace the MoreComments objects in comments with actual comments.
+
+        :param limit: the maximum number of requests to make. Defaults to the
+            more_comments_max setting; a negative value means no limit.
+        :param order: the order to expand MoreComments objects in when the
+            limit may not be enough for all of them. Either 'largest' (most
+            comments first), 'shallowest' (closest to the top level first), a
+            callable returning a sort key for a MoreComments object, or None
+            for tree order. Defaults to the more_comments_order setting.
+        :returns: the list of MoreComments objects that were skipped.
+        """
+        skipped = self._replace_more_comments(limit, order)
+        self._all_comments = True
+        self._comments_flat = None
+        return skipped
+
     def set_flair(self, *args, **kwargs):
         """Set flair for this submission."""
         return self.subreddit.set_flair(self, *args, **kwargs)
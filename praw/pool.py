@@ -0,0 +1,133 @@
+# This file is part of PRAW.
+#
+# PRAW is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# PRAW is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# PRAW.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Pools of logged in sessions.
+
+A SessionPool spreads calls over several accounts. Every account is a Reddit
+session of its own, with its own modhash and its own rate budget, so the pool
+can make as many requests as all of its accounts together.
+"""
+
+import threading
+import time
+
+from praw import Reddit
+from praw.errors import ClientException
+
+
+class _Account(object):  # pylint: disable-msg=R0903
+    """A session of a pool and its usage statistics."""
+    def __init__(self, session):
+        self.session = session
+        self.added = time.time()
+        self.last_used = 0
+        self.calls = 0
+        self.requests = 0
+        # Session hooks start out empty before requests 1.0
+        session.http.hooks.setdefault('response', []).append(
+            self._count_response)
+
+    def _count_response(self, response, *args, **kwargs):
+        """Response hook counting the requests made by the session."""
+        # pylint: disable-msg=W0613
+        self.requests += 1
+        return response
+
+
+class SessionPool(object):
+    """
+    A pool of logged in sessions.
+
+    Calling a Reddit method on the pool calls it on the least recently used
+    session, so that the calls are spread evenly over the accounts. The
+    objects returned are bound to that session, so calls made through them are
+    made by the same account.
+    """
+    def __init__(self, user_agent, accounts=(), site_name=None,
+                 disable_update_check=False):
+        """
+        Create a pool logged in with every (username, password) in accounts.
+
+        More accounts can be added with add and add_session.
+        """
+        self.user_agent = user_agent
+        self.site_name = site_name
+        self.disable_update_check = disable_update_check
+        self._accounts = []
+        self._lock = threading.Lock()
+        for username, password in accounts:
+            self.add(username, password)
+
+    def __getattr__(self, attr):
+        if attr.startswith('_') or not callable(getattr(Reddit, attr, None)):
+            raise AttributeError('%r object has no attribute %r'
+                                 % (self.__class__.__name__, attr))
+
+        def dispatch(*args, **kwargs):
+            """Call the method on the least recently used session."""
+            return getattr(self.acquire(), attr)(*args, **kwargs)
+        dispatch.__name__ = attr
+        return dispatch
+
+    def __len__(self):
+        return len(self._accounts)
+
+    @property
+    def sessions(self):
+        """The sessions of the pool."""
+        return [account.session for account in self._accounts]
+
+    def acquire(self):
+        """Return the least recently used session and mark it as used."""
+        with self._lock:
+            if not self._accounts:
+                raise ClientException('The session pool is empty.')
+            account = min(self._accounts, key=lambda x: x.last_used)
+            account.last_used = time.time()
+            account.calls += 1
+        return account.session
+
+    def add(self, username, password=None):
+        """Log in a new session as username and add it to the pool."""
+        session = Reddit(self.user_agent, self.site_name,
+                         disable_update_check=self.disable_update_check)
+        session.login(username, password)
+        return self.add_session(session)
+
+    def add_session(self, session):
+        """Add a logged in session to the pool and return it."""
+        if session.user is None:
+            raise ClientException('Only logged in sessions can be pooled.')
+        with self._lock:
+            self._accounts.append(_Account(session))
+        return session
+
+    def stats(self):
+        """
+        Return the usage statistics of every account, by user name.
+
+        For each account this is a dict holding the number of calls dispatched
+        to it, the number of HTTP requests it made and its throughput in
+        requests per second since it was added to the pool.
+        """
+        now = time.time()
+        stats = {}
+        for account in self._accounts:
+            elapsed = max(now - account.added, 1e-6)
+            stats[account.session.user.name] = {
+                'calls': account.calls,
+                'requests': account.requests,
+                'requests_per_second': account.requests / elapsed}
+        return stats
@@ -0,0 +1,113 @@
+# This file is part of PRAW.
+#
+# PRAW is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# PRAW is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# PRAW.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Rate limiters.
+
+The SleepAfter decorator asks one of the rate limiters defined here for the
+time at which the next request to a domain may be made. LocalRateLimiter,
+used by default, only coordinates the requests of the current process.
+FileRateLimiter, used when rate_limit_file is set in praw.ini, shares the
+schedule between every process on the machine using the same file.
+
+Both limiters implement a token bucket holding up to api_request_burst
+requests and refilled at one request every api_request_delay seconds. The
+bucket is stored as the single time at which it will be full again, so a
+schedule is just one timestamp per domain.
+"""
+
+import json
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # pylint: disable-msg=C0103
+
+from praw.errors import ClientException
+
+
+def _schedule(full_at, delay, burst):
+    """
+    Return the next request slot and the new time the bucket is full at.
+
+    full_at is when the bucket would be full again if no request was made,
+    delay the time needed to refill one request and burst the bucket size.
+    """
+    now = time.time()
+    full_at = max(full_at, now)
+    slot = max(now, full_at - (max(burst, 1) - 1) * delay)
+    return slot, full_at + delay
+
+
+class LocalRateLimiter(object):  # pylint: disable-msg=R0903
+    """Schedule the requests made by this process, from any thread."""
+    def __init__(self):
+        self.full_at = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, key, delay, burst=1):
+        """
+        Reserve the next request slot for key and return its time.
+
+        Up to burst slots are granted immediately after an idle period, after
+        which slots for the same key are delay seconds apart. The caller is
+        expected to wait until the returned time before making its request.
+        """
+        with self._lock:
+            slot, self.full_at[key] = _schedule(self.full_at.get(key, 0),
+                                                delay, burst)
+        return slot
+
+
+class FileRateLimiter(object):  # pylint: disable-msg=R0903
+    """
+    Schedule the requests of every process sharing a lock file.
+
+    The file holds the bucket schedule of every key. It is locked only for
+    the duration of a reservation, so processes sleep until their slot
+    without holding the lock and wake up as soon as it is their turn. Each
+    reservation opens the file anew, so threads are serialized by the same
+    lock as processes.
+    """
+    def __init__(self, path):
+        if fcntl is None:
+            raise ClientException('rate_limit_file is not supported on this '
+                                  'platform.')
+        self.path = path
+
+    def reserve(self, key, delay, burst=1):
+        """
+        Reserve the next request slot for key and return its time.
+
+        Works like LocalRateLimiter.reserve across all processes using the
+        same file.
+        """
+        with open(self.path, 'a+') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                lock_file.seek(0)
+                try:
+                    schedules = json.loads(lock_file.read())
+                except ValueError:  # New or corrupt file
+                    schedules = {}
+                slot, schedules[key] = _schedule(schedules.get(key, 0), delay,
+                                                 burst)
+                lock_file.truncate(0)
+                lock_file.write(json.dumps(schedules))
+                lock_file.flush()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return slot
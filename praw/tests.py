@@ -20,7 +20,11 @@
 
 from __future__ import unicode_literals
 
+import json
+import os
 import random
+import tempfile
+import threading
 import time
 import unittest
 import uuid
@@ -29,8 +33,18 @@ from requests.compat import urljoin
 from requests.exceptions import HTTPError, Timeout
 from six import advance_iterator as six_next, text_type
 
-from praw import Reddit, errors, helpers
+from praw import Config, Reddit, errors, helpers
+from praw.decorators import Memoize
+try:
+    from praw.aio import AsyncReddit
+except (ImportError, SyntaxError):  # Python < 3.6
+    AsyncReddit = None
+from praw.cache import MemoryCache, SQLiteCache
+from praw.checkpoints import FileCheckpoint, MemoryCheckpoint, SQLiteCheckpoint
+from praw.ratelimit import FileRateLimiter, LocalRateLimiter
 from praw.objects import Comment, LoggedInRedditor, Message, MoreComments
+from praw.pool import SessionPool
+from praw.settings import CONFIG
 
 USER_AGENT = 'PRAW_test_suite'
 
@@ -95,6 +109,26 @@ class BasicTest(unittest.TestCase, BasicHelper):
                           (isinstance(item, Comment) or
                            isinstance(item, MoreComments))])
 
+    def test_config_endpoint(self):
+        config = self.r.config
+        self.assertEqual('moderators',
+                         config.endpoint(config['moderators'] % self.sr))
+        self.assertEqual('subreddit',
+                         config.endpoint(config['subreddit'] % self.sr))
+        self.assertEqual('login', config.endpoint(config['login']))
+        self.assertEqual(None, config.endpoint(self.link_url))
+
+    def test_config_endpoint_scoped_listing(self):
+        config = self.r.config
+        self.assertEqual('new', config.endpoint(
+            config['subreddit'] % self.sr + 'new/.json'))
+        self.assertEqual('comments', config.endpoint(
+            self.url('r/all/comments/')))
+        self.assertEqual('comments', config.endpoint(
+            config['user'] % self.un + 'comments'))
+        self.assertEqual(None, config.endpoint(
+            config['subreddit'] % self.sr + 'about/unknown/'))
+
     def test_equality(self):
         subreddit = self.r.get_subreddit(self.sr)
         same_subreddit = self.r.get_subreddit(self.sr)
@@ -103,6 +137,17 @@ class BasicTest(unittest.TestCase, BasicHelper):
         self.assertFalse(subreddit != same_subreddit)
         self.assertFalse(subreddit == submission)
 
+    def test_flyweights(self):
+        # pylint: disable-msg=W0212
+        page = json.dumps([{'kind': 't1', 'data': {
+            'id': text_type(i), 'author': 'a', 'replies': '',
+            'subreddit': 'b'}} for i in range(2)])
+        first, second = self.r._parse_json(page)
+        self.assertTrue(first.author is second.author)
+        self.assertTrue(first.subreddit is second.subreddit)
+        other = Reddit(USER_AGENT, disable_update_check=True)
+        self.assertFalse(first.author is other._parse_json(page)[0].author)
+
     def test_get_all_comments(self):
         num = 50
         self.assertEqual(num, len(list(self.r.get_all_comments(limit=num))))
@@ -116,11 +161,48 @@ class BasicTest(unittest.TestCase, BasicHelper):
         num = 50
         self.assertEqual(num, len(list(self.r.get_front_page(limit=num))))
 
+    def test_get_info_bulk(self):
+        things = list(self.r.get_new(limit=5, url_data={'sort': 'new'}))
+        fullnames = [thing.name for thing in reversed(things)]
+        result = self.r.get_info_bulk(fullnames)
+        self.assertEqual(fullnames, [thing.name for thing in result])
+        comment_name = self.r.get_submission(
+            url=self.comment_url).comments[0].name
+        self.assertRaises(errors.ClientException, self.r.get_info_bulk,
+                          fullnames + [comment_name])
+
     def test_get_new(self):
         num = 50
         result = self.r.get_new(limit=num, url_data={'sort': 'new'})
         self.assertEqual(num, len(list(result)))
 
+    def test_get_new_prefetch(self):
+        num = 50
+        result = self.r.get_new(limit=num, url_data={'sort': 'new'},
+                                prefetch=True)
+        self.assertEqual(num, len(list(result)))
+
+    def test_get_new_checkpoint(self):
+        num = 50
+        url_data = {'sort': 'new'}
+        expected = [thing.name for thing in
+                    self.r.get_new(limit=num, url_data=dict(url_data))]
+        checkpoint = MemoryCheckpoint()
+        result = self.r.get_new(limit=num, url_data=dict(url_data),
+                                checkpoint=checkpoint)
+        names = [six_next(result).name for _ in range(30)]
+        result = self.r.get_new(limit=num, url_data=dict(url_data),
+                                checkpoint=checkpoint)
+        names.extend(thing.name for thing in result)
+        self.assertEqual(expected, names)
+        self.assertTrue(checkpoint.cursor['done'])
+
+    def test_get_new_stream_json(self):
+        num = 50
+        self.r.config.stream_json = True
+        result = self.r.get_new(limit=num, url_data={'sort': 'new'})
+        self.assertEqual(num, len(list(result)))
+
     def test_get_popular_reddits(self):
         num = 50
         self.assertEqual(num, len(list(self.r.get_popular_reddits(limit=num))))
@@ -166,6 +248,34 @@ class BasicTest(unittest.TestCase, BasicHelper):
         self.assertTrue(self.r.is_username_available('_Daimon__'))
         self.assertFalse(self.r.is_username_available(''))
 
+    def test_compact_objects(self):
+        # pylint: disable-msg=W0212
+        self.r.config.compact_objects = True
+        page = json.dumps([{'kind': 't1', 'data': {
+            'id': text_type(i), 'author': 'b', 'body': 'c', 'replies': '',
+            'subreddit': 'd'}} for i in range(2)])
+        first, second = self.r._parse_json(page)
+        self.assertFalse('body' in second.__dict__)
+        self.assertEqual('1', second.id)
+        self.assertEqual('b', second.author.name)
+        self.assertEqual('d', second.subreddit.display_name)
+        self.assertEqual([], second.replies)
+        second.body = 'e'
+        self.assertEqual(('c', 'e'), (first.body, second.body))
+        self.assertRaises(AttributeError, getattr, second, 'title')
+
+    def test_lazy_objects(self):
+        # pylint: disable-msg=W0212
+        self.r.config.lazy_objects = True
+        page = json.dumps({'kind': 't3', 'data': {
+            'id': 'a', 'author': 'b', 'permalink': '/r/c/', 'subreddit': 'c'}})
+        submission = self.r._parse_json(page)
+        self.assertFalse('author' in submission.__dict__)
+        self.assertEqual('b', submission.author.name)
+        self.assertTrue('author' in submission.__dict__)
+        self.assertEqual('c', submission.subreddit.display_name)
+        self.assertRaises(AttributeError, getattr, submission, 'title')
+
     def test_not_logged_in_submit(self):
         self.assertRaises(errors.LoginRequired, self.r.submit,
                           self.sr, 'TITLE', text='BODY')
@@ -173,6 +283,22 @@ class BasicTest(unittest.TestCase, BasicHelper):
     def test_not_logged_in_when_initialized(self):
         self.assertEqual(self.r.user, None)
 
+    def test_parse_json_backends(self):
+        # pylint: disable-msg=W0212
+        page = json.dumps({'kind': 'Listing', 'data': {'children': [
+            {'kind': 't1', 'data': {'id': 'a', 'body': 'b', 'replies': {
+                'kind': 'Listing', 'data': {'children': [
+                    {'kind': 'more', 'data': {'children': ['c']}}]}}}},
+            {'kind': 't3', 'data': {'id': 'd', 'permalink': '/r/e/',
+                                    'media': {'oembed': {'type': 'video'}}}}
+        ]}})
+        for backend in (None, 'json'):
+            self.r.config.json_backend = backend
+            comment, submission = self.r._parse_json(page)['data']['children']
+            self.assertTrue(isinstance(comment, Comment))
+            self.assertTrue(isinstance(comment.replies[0], MoreComments))
+            self.assertEqual({'oembed': {'type': 'video'}}, submission.media)
+
     def test_require_user_agent(self):
         self.assertRaises(TypeError, Reddit, user_agent=None)
         self.assertRaises(TypeError, Reddit, user_agent='')
@@ -186,11 +312,102 @@ class BasicTest(unittest.TestCase, BasicHelper):
     def test_search_reddit_names(self):
         self.assertTrue(len(self.r.search_reddit_names('reddit')) > 0)
 
+    def test_stream_submissions(self):
+        checkpoint = MemoryCheckpoint()
+        stream = self.r.stream_submissions(self.sr, checkpoint=checkpoint)
+        submission = six_next(stream)
+        self.assertEqual(submission.name, checkpoint.cursor['high_water'])
+
     def test_timeout(self):
         # pylint: disable-msg=W0212
         self.assertRaises(Timeout, helpers._request, self.r,
                           self.r.config['comments'], timeout=0.001)
 
+    def test_user_agent_per_session(self):
+        other = Reddit('other_user_agent', disable_update_check=True)
+        self.assertTrue(USER_AGENT in self.r.http.headers['User-Agent'])
+        self.assertTrue('other_user_agent' in other.http.headers['User-Agent'])
+
+
+class AsyncRedditTest(unittest.TestCase, BasicHelper):
+    def setUp(self):
+        if AsyncReddit is None:
+            self.skipTest('AsyncReddit requires Python 3.6 or later.')
+        self.configure()
+        self.r = AsyncReddit(USER_AGENT, disable_update_check=True)
+
+    def collect(self, listing):
+        import asyncio
+        loop = asyncio.new_event_loop()
+        iterator = listing.__aiter__()
+        things = []
+        try:
+            while True:
+                things.append(loop.run_until_complete(iterator.__anext__()))
+        except StopAsyncIteration:  # pylint: disable-msg=E0602
+            return things
+        finally:
+            loop.close()
+
+    def test_get_new_async(self):
+        num = 50
+        things = self.collect(self.r.get_new(limit=num))
+        self.assertEqual(num, len(things))
+
+    def test_get_new_blocking(self):
+        num = 10
+        self.assertEqual(num, len(list(self.r.get_new(limit=num))))
+
+    def test_request_json_during_async_flight(self):
+        import asyncio
+
+        class Response(object):
+            headers = {}
+            status_code = 200
+            text = '{"data": {"children": []}}'
+
+            def raise_for_status(self):
+                pass
+
+        class HTTP(object):
+            def __init__(self):
+                self.urls = []
+                self.second = threading.Event()
+
+            def get(self, url, **kwargs):
+                # pylint: disable-msg=W0613
+                self.urls.append(url)
+                if len(self.urls) == 1:  # Keep the flight in the air
+                    self.second.wait(10)
+                else:
+                    self.second.set()
+                return Response()
+        self.r.config.api_request_delay = 0
+        self.r.http = HTTP()
+        url = self.url('r/%s/new/' % uuid.uuid4().hex)
+        results = []
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                # The blocking call is made on the thread of the event loop
+                # while the coroutine leading the flight is suspended
+                task = loop.create_task(self.r.request_json_async(url))
+                loop.run_until_complete(asyncio.sleep(0.01))
+                results.append(self.r.request_json(url))
+                results.append(loop.run_until_complete(task))
+            finally:
+                asyncio.set_event_loop(None)
+                loop.close()
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual([{'data': {'children': []}}] * 2, results)
+        self.assertEqual(2, len(self.r.http.urls))
+
 
 class CacheTest(unittest.TestCase, AuthenticatedHelper):
     def setUp(self):
@@ -241,6 +458,282 @@ class CacheTest(unittest.TestCase, AuthenticatedHelper):
         self.assertEqual(original_listing, new_user_listing)
 
 
+class JSONStreamTest(unittest.TestCase):
+    class Response(object):
+        def __init__(self, data, chunk_size):
+            self.body = json.dumps(data).encode('utf-8')
+            self.chunk_size = chunk_size
+            self.closed = False
+
+        def close(self):
+            self.closed = True
+
+        def iter_content(self, _):
+            for i in range(0, len(self.body), self.chunk_size):
+                yield self.body[i:i + self.chunk_size]
+
+    def setUp(self):
+        self.children = [{'kind': 't1', 'data': {'body': '\u2603 %d' % i,
+                                                 'score': 1234567 * i}}
+                         for i in range(10)]
+        self.data = [{'kind': 'Listing', 'data': {'children': []}},
+                     {'kind': 'Listing', 'data': {'after': 't1_z',
+                                                  'children': self.children,
+                                                  'modhash': 'abc'}}]
+
+    def test_decode(self):
+        for chunk_size in (1, 3, 1000):
+            response = self.Response(self.data, chunk_size)
+            stream = helpers._JSONStream(response, (1, 'data', 'children'))
+            self.assertEqual(self.children, list(stream))
+            self.assertEqual('t1_z', stream.root[1]['data']['after'])
+            self.assertEqual([], stream.root[1]['data']['children'])
+            self.assertTrue(response.closed)
+
+    def test_incomplete(self):
+        response = self.Response(self.data, 5)
+        response.body = response.body[:-20]
+        stream = helpers._JSONStream(response, (1, 'data', 'children'))
+        self.assertRaises(ValueError, list, stream)
+
+
+class MemoizeTest(unittest.TestCase):
+    class Response(object):
+        def __init__(self, status_code, text, headers):
+            self.status_code = status_code
+            self.text = text
+            self.headers = headers
+
+    def setUp(self):
+        self.r = Reddit(USER_AGENT, disable_update_check=True)
+        self.calls = []
+
+        def function(reddit_session, page_url, raw=False, headers=None):
+            self.calls.append(headers)
+            time.sleep(0.2)
+            if headers and headers.get('If-None-Match') == 'v1':
+                return self.Response(304, '', {'ETag': 'v1'})
+            return self.Response(200, page_url, {'ETag': 'v1'})
+        self.memoized = Memoize(function)
+
+    def call_concurrently(self, count):
+        results = []
+
+        def call():
+            results.append(self.memoized(self.r, 'http://www.reddit.com/a'))
+        threads = [threading.Thread(target=call) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_coalesce_concurrent_calls(self):
+        results = self.call_concurrently(5)
+        self.assertEqual(['http://www.reddit.com/a'] * 5, results)
+        self.assertEqual(1, len(self.calls))
+
+    def test_conditional_request(self):
+        self.r.config.cache_timeout = 0.1
+        url = 'http://www.reddit.com/a'
+        self.assertEqual(url, self.memoized(self.r, url))
+        time.sleep(0.2)
+        self.assertEqual(url, self.memoized(self.r, url))
+        self.assertEqual([None, {'If-None-Match': 'v1'}], self.calls)
+
+    def test_stale_while_revalidate(self):
+        self.r.config.cache_timeout = 0.1
+        self.r.config.cache_stale_while_revalidate = {'new': 10}
+        url = self.r.config['new']
+        self.memoized(self.r, url)
+        time.sleep(0.2)
+        start = time.time()
+        self.assertEqual(url, self.memoized(self.r, url))
+        self.assertTrue(time.time() - start < 0.1)
+        time.sleep(0.3)
+        self.assertEqual(2, len(self.calls))
+
+    def test_endpoint_timeouts(self):
+        self.r.config.cache_timeout = 0.1
+        self.r.config.cache_timeouts = {'new': 0, 'moderators': 100}
+        for url in (self.r.config['new'],
+                    self.r.config['moderators'] % 'reddit_api_test'):
+            self.memoized(self.r, url)
+        time.sleep(0.2)
+        for url in (self.r.config['new'],
+                    self.r.config['moderators'] % 'reddit_api_test'):
+            self.memoized(self.r, url)
+        self.assertEqual(3, len(self.calls))
+
+    def test_plugged_cache(self):
+        cache = MemoryCache()
+        self.r.config.cache = cache
+        url = 'http://www.reddit.com/a'
+        self.memoized(self.r, url)
+        self.assertEqual(1, len(cache))
+        self.assertEqual(url, self.memoized(self.r, url))
+        self.assertEqual(1, len(self.calls))
+        self.memoized.evict([url])
+        self.assertEqual(0, len(cache))
+
+    def test_no_coalescing_without_cache(self):
+        self.r.config.cache_timeout = 0
+        self.call_concurrently(3)
+        self.assertEqual(3, len(self.calls))
+
+
+class MemoryCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = MemoryCache()
+
+    def test_expire_oldest_first(self):
+        for i in range(10):
+            self.cache.set(i, 'value', i)
+        self.cache.expire(10, 4.5)
+        self.assertEqual(list(range(6, 10)), sorted(self.cache))
+
+    def test_expire_per_entry_timeout(self):
+        for i in range(10):
+            self.cache.set(i, 'value', i, timeout=1 if i % 2 else 100)
+        self.cache.set(10, 'value', 0)
+        self.cache.expire(10)
+        self.assertEqual([0, 2, 4, 6, 8, 9, 10], sorted(self.cache))
+
+    def test_expire_keeps_stale_entries(self):
+        self.cache.set(0, 'value', 0, validators={'ETag': 'v1'})
+        self.cache.set(1, 'value', 1, keep_stale=True)
+        self.cache.set(2, 'value', 0)
+        self.cache.expire(10, 5)
+        self.assertEqual([0, 1], sorted(self.cache))
+        self.assertRaises(KeyError, self.cache.get, 0)
+        self.assertEqual(('value', {'ETag': 'v1'}, 0),
+                         self.cache.get_stale(0))
+        self.assertEqual(('value', None, 1), self.cache.get_stale(1))
+
+    def test_max_bytes(self):
+        self.cache.set('a', 'x' * 10, 0, max_bytes=25)
+        self.cache.set('b', 'x' * 10, 0, max_bytes=25)
+        self.cache.set('c', 'x' * 10, 0, max_bytes=25)
+        self.assertEqual(['b', 'c'], sorted(self.cache))
+        self.assertEqual(20, self.cache.total_size)
+        self.cache.set('d', 'x' * 30, 0, max_bytes=25)
+        self.assertFalse('d' in self.cache)
+
+    def test_max_entries_evicts_least_recently_used(self):
+        for i in range(3):
+            self.cache.set(i, 'value', 0, max_entries=3)
+        self.cache.get(0)
+        self.cache.set(3, 'value', 0, max_entries=3)
+        self.assertEqual([0, 2, 3], sorted(self.cache))
+
+    def test_max_entries_threads(self):
+        def fill(offset):
+            for i in range(offset, offset + 1000):
+                self.cache.set(i, 'value', 0, max_entries=100,
+                               url='http://www.reddit.com/r/%d' % (i % 7))
+                self.cache.expire(0, 1)
+        threads = [threading.Thread(target=fill, args=(x * 1000,))
+                   for x in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(100, len(self.cache))
+        self.assertEqual(500, self.cache.total_size)
+        self.cache.remove_url('http://www.reddit.com/r')
+        self.assertEqual(0, len(self.cache))
+
+    def test_remove_url(self):
+        url = 'http://www.reddit.com/user/bob'
+        self.cache.set(0, 'value', 0, url=url)
+        self.cache.set(1, 'value', 0, url=url + '/comments')
+        self.cache.set(2, 'value', 0, url=url + 'by/comments')
+        self.cache.set(3, 'value', 0, url='http://www.reddit.com')
+        self.cache.remove_url(url)
+        self.assertEqual([2, 3], sorted(self.cache))
+        self.cache.remove_url('http://www.reddit.com')
+        self.assertEqual([], list(self.cache))
+
+
+class SQLiteCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = SQLiteCache(':memory:')
+
+    def test_expire(self):
+        for i in range(10):
+            self.cache.set(text_type(i), 'value', i)
+        self.cache.expire(10, 4.5)
+        self.assertEqual(['6', '7', '8', '9'], sorted(self.cache))
+
+    def test_expire_keeps_stale_entries(self):
+        self.cache.set('0', 'value', 0, validators={'ETag': 'v1'})
+        self.cache.set('1', 'value', 1, keep_stale=True)
+        self.cache.set('2', 'value', 0)
+        self.cache.expire(10, 5)
+        self.assertEqual(['0', '1'], sorted(self.cache))
+        self.assertRaises(KeyError, self.cache.get, '0')
+        self.assertEqual(('value', {'ETag': 'v1'}, 0),
+                         self.cache.get_stale('0'))
+        self.assertEqual(('value', None, 1), self.cache.get_stale('1'))
+
+    def test_get(self):
+        self.cache.set('key', '\xd0 value', 0)
+        self.assertEqual('\xd0 value', self.cache.get('key'))
+        self.assertRaises(KeyError, self.cache.get, 'other')
+
+    def test_get_without_modhash(self):
+        body = json.dumps({'kind': 'Listing', 'data': {
+            'modhash': 'old', 'children': [], 'after': None}})
+        self.cache.set('key', body, 0)
+        self.assertEqual({'kind': 'Listing', 'data': {
+            'children': [], 'after': None}}, json.loads(self.cache.get('key')))
+        r = Reddit(USER_AGENT, disable_update_check=True)
+        r.user, r.modhash = 'PyApiTestUser2', 'new'
+        r._parse_json(self.cache.get('key'))  # pylint: disable-msg=W0212
+        self.assertEqual('new', r.modhash)
+
+    def test_max_entries(self):
+        self.cache.TRIM_INTERVAL = 1
+        for i in range(5):
+            self.cache.set(text_type(i), 'value', 0, max_entries=3)
+        self.assertEqual(3, len(self.cache))
+
+    def test_remove_url(self):
+        url = 'http://www.reddit.com/user/bob'
+        self.cache.set('0', 'value', 0, url=url)
+        self.cache.set('1', 'value', 0, url=url + '/comments')
+        self.cache.set('2', 'value', 0, url=url + 'by/comments')
+        self.cache.set('3', 'value', 0, url='http://www.reddit.com')
+        self.cache.remove_url(url)
+        self.assertEqual(['2', '3'], sorted(self.cache))
+        self.cache.remove_url('http://www.reddit.com')
+        self.assertEqual([], list(self.cache))
+
+
+class CheckpointTest(unittest.TestCase):
+    def setUp(self):
+        self.cursor = {'after': 't3_abc', 'offset': 3, 'found': 28,
+                       'done': False}
+
+    def test_file_checkpoint(self):
+        path = os.path.join(tempfile.mkdtemp(), 'checkpoint.json')
+        checkpoint = FileCheckpoint(path)
+        self.assertEqual(None, checkpoint.load())
+        checkpoint.save(self.cursor)
+        self.assertEqual(self.cursor, FileCheckpoint(path).load())
+        checkpoint.clear()
+        self.assertEqual(None, checkpoint.load())
+
+    def test_sqlite_checkpoint(self):
+        path = os.path.join(tempfile.mkdtemp(), 'checkpoints.db')
+        checkpoint = SQLiteCheckpoint(path, 'new')
+        checkpoint.save(self.cursor)
+        self.assertEqual(None, SQLiteCheckpoint(path, 'top').load())
+        self.assertEqual(self.cursor, SQLiteCheckpoint(path, 'new').load())
+        checkpoint.clear()
+        self.assertEqual(None, checkpoint.load())
+
+
 class EncodingTest(unittest.TestCase, AuthenticatedHelper):
     def setUp(self):
         self.configure()
@@ -289,6 +782,96 @@ class MoreCommentsTest(unittest.TestCase, AuthenticatedHelper):
         self.assertTrue(ac_len < acf_len)
         self.assertTrue(cf_len < acf_len)
 
+    def test_replace_more_comments_limit(self):
+        with warnings.catch_warnings(record=True) as warning:
+            warnings.simplefilter('always')
+            skipped = self.submission.replace_more_comments(limit=1,
+                                                            order='largest')
+            self.assertTrue(warning)
+        self.assertTrue(skipped)
+        self.assertFalse([x for x in self.submission.comments_flat
+                          if isinstance(x, MoreComments)])
+
+
+class MoreCommentsBatchTest(unittest.TestCase):
+    """Expands MoreComments objects of a thread served from memory."""
+    PERMALINK = '/r/test/comments/sub/test/'
+
+    @staticmethod
+    def comment(name, parent, replies=''):
+        return {'kind': 't1', 'data': {'id': name, 'name': 't1_' + name,
+                                       'body': '', 'parent_id': parent,
+                                       'link_id': 't3_sub', 'ups': 1,
+                                       'downs': 0, 'replies': replies}}
+
+    @staticmethod
+    def more(children, parent):
+        return {'kind': 'more', 'data': {'id': children[0],
+                                         'name': 't1_' + children[0],
+                                         'parent_id': parent,
+                                         'count': len(children),
+                                         'children': children}}
+
+    def request(self, page_url, params=None, url_data=None, timeout=None,
+                raw=False, stream=False):
+        # pylint: disable-msg=W0613
+        if 'morechildren' not in page_url:
+            submission = {'kind': 't3', 'data': {
+                'id': 'sub', 'name': 't3_sub', 'permalink': self.PERMALINK,
+                'subreddit': 'test'}}
+            c0_replies = {'kind': 'Listing', 'data': {'children': [
+                self.more(['c3'], 't1_c0')]}}
+            return json.dumps([
+                {'kind': 'Listing', 'data': {'children': [submission]}},
+                {'kind': 'Listing', 'data': {'children': [
+                    self.comment('c0', 't3_sub', c0_replies),
+                    self.more(['c1', 'c2'], 't3_sub')]}}])
+        children = params['children'].split(',')
+        self.requests.append(children)
+        parents = {'c1': 't3_sub', 'c2': 't3_sub', 'c3': 't1_c0',
+                   'c4': 't1_c1'}
+        things = [self.comment(x, parents[x]) for x in children]
+        if 'c1' in children:  # A nested stub, only found on expansion
+            things.append(self.more(['c4'], 't1_c1'))
+        return json.dumps({'json': {'errors': [], 'data': {
+            'things': things}}})
+
+    def setUp(self):
+        # pylint: disable-msg=W0212
+        self.requests = []
+        self.r = Reddit(USER_AGENT, disable_update_check=True)
+        self.r.config.api_request_delay = 0
+        self.r.config.cache_timeout = 0
+        self.r.config.more_children_max = 2
+        self.r._request = self.request
+        self.submission = self.r.get_submission(self.PERMALINK)
+
+    def test_batches(self):
+        self.submission.replace_more_comments(limit=-1)
+        self.assertEqual([['c1', 'c2'], ['c3', 'c4']],
+                         [sorted(x) for x in self.requests])
+        by_id = dict((x.id, x) for x in self.submission.comments_flat)
+        self.assertEqual(['c0', 'c1', 'c2'],
+                         [x.id for x in self.submission.comments])
+        self.assertEqual(['c3'], [x.id for x in by_id['c0'].replies])
+        self.assertEqual(['c4'], [x.id for x in by_id['c1'].replies])
+        self.assertFalse([x for x in self.submission.comments_flat
+                          if isinstance(x, MoreComments)])
+
+    def test_invalid_more_children_max(self):
+        CONFIG.set('reddit', 'more_children_max', '0')
+        try:
+            self.assertRaises(errors.ClientException, Config, 'reddit')
+        finally:
+            CONFIG.remove_option('reddit', 'more_children_max')
+
+    def test_invalid_more_comments_order(self):
+        CONFIG.set('reddit', 'more_comments_order', 'deepest')
+        try:
+            self.assertRaises(errors.ClientException, Config, 'reddit')
+        finally:
+            CONFIG.remove_option('reddit', 'more_comments_order')
+
 
 class CommentAttributeTest(unittest.TestCase, BasicHelper):
     def setUp(self):
@@ -311,6 +894,10 @@ class CommentAttributeTest(unittest.TestCase, BasicHelper):
         comment = self.submission.comments[0]
         self.assertEqual(comment.ups - comment.downs, comment.score)
 
+    def test_iter_comments_flat(self):
+        self.assertEqual(self.submission.comments_flat,
+                         list(self.submission.iter_comments_flat()))
+
 
 class CommentEditTest(unittest.TestCase, AuthenticatedHelper):
     def setUp(self):
@@ -572,6 +1159,96 @@ class FlairTemplateTest(unittest.TestCase, AuthenticatedHelper):
         self.subreddit.clear_flair_templates(True)
 
 
+class ListingTest(unittest.TestCase):
+    """Pages through a listing of SIZE submissions served from memory."""
+    SIZE = 10
+
+    def request(self, page_url, params=None, url_data=None, timeout=None,
+                raw=False, stream=False):
+        # pylint: disable-msg=W0613
+        self.requests.append(dict(url_data))
+        start = int(url_data['after'][3:]) + 1 if 'after' in url_data else 0
+        end = min(start + url_data.get('limit', 4), self.SIZE)
+        children = [{'kind': 't3', 'data': {
+            'id': text_type(i), 'name': 't3_%d' % i,
+            'permalink': '/r/test/comments/%d/test/' % i,
+            'subreddit': 'test'}} for i in range(start, end)]
+        after = 't3_%d' % (end - 1) if end < self.SIZE else None
+        return json.dumps({'kind': 'Listing', 'data': {
+            'children': children, 'after': after}})
+
+    def setUp(self):
+        # pylint: disable-msg=W0212
+        self.requests = []
+        self.r = Reddit(USER_AGENT, disable_update_check=True)
+        self.r.config.api_request_delay = 0
+        self.r.config.cache_timeout = 0
+        self.r.config.content_page_max = 0
+        self.r._request = self.request
+        self.url = self.r.config['new']
+
+    def test_checkpoint_resume(self):
+        checkpoint = MemoryCheckpoint()
+        result = self.r.get_content(self.url, limit=None,
+                                    checkpoint=checkpoint)
+        names = [six_next(result).name for _ in range(6)]
+        result = self.r.get_content(self.url, limit=None,
+                                    checkpoint=checkpoint)
+        names.extend(thing.name for thing in result)
+        self.assertEqual(['t3_%d' % i for i in range(self.SIZE)], names)
+        self.assertTrue(checkpoint.cursor['done'])
+        self.assertEqual([], list(self.r.get_content(
+            self.url, limit=None, checkpoint=checkpoint)))
+
+    def test_get_content_async(self):
+        if AsyncReddit is None:
+            self.skipTest('AsyncReddit requires Python 3.6 or later.')
+        import asyncio
+        loop = asyncio.new_event_loop()
+        session = AsyncReddit(USER_AGENT, disable_update_check=True)
+        session.config.cache_timeout = 0
+        session.config.content_page_max = 0
+
+        def request_async(page_url, params=None, url_data=None):
+            future = loop.create_future()
+            future.set_result(self.request(page_url, params, url_data))
+            return future
+        session._request_async = request_async  # pylint: disable-msg=W0212
+        checkpoint = MemoryCheckpoint()
+        iterator = session.get_content(self.url, limit=7, prefetch=True,
+                                       checkpoint=checkpoint).__aiter__()
+        names = []
+        asyncio.set_event_loop(loop)
+        try:
+            while True:
+                names.append(loop.run_until_complete(
+                    iterator.__anext__()).name)
+        except StopAsyncIteration:  # pylint: disable-msg=E0602
+            pass
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+        self.assertEqual(['t3_%d' % i for i in range(7)], names)
+        self.assertEqual({'after': 't3_3', 'offset': 3, 'found': 7,
+                          'done': True}, checkpoint.cursor)
+
+    def test_page_limit(self):
+        self.r.config.content_page_max = 4
+        self.assertEqual(9, len(list(self.r.get_content(self.url, limit=9))))
+        self.assertEqual([4, 4, 1], [x['limit'] for x in self.requests])
+
+    def test_page_limit_disabled(self):
+        self.assertEqual(5, len(list(self.r.get_content(self.url, limit=5))))
+        self.assertEqual(2, len(self.requests))
+        self.assertFalse([x for x in self.requests if 'limit' in x])
+
+    def test_page_limit_from_url_data(self):
+        self.r.config.content_page_max = 4
+        result = self.r.get_content(self.url, limit=5, url_data={'limit': 3})
+        self.assertEqual(5, len(list(result)))
+        self.assertEqual([3, 3], [x['limit'] for x in self.requests])
+
+
 class LocalOnlyTest(unittest.TestCase, BasicHelper):
     def setUp(self):
         self.configure()
@@ -750,6 +1427,45 @@ class ModeratorUserTest(unittest.TestCase, AuthenticatedHelper):
         self.assertFalse(self.other in self.subreddit.get_banned())
 
 
+class RateLimiterTest(unittest.TestCase):
+    def test_file_limiter_shares_slots(self):
+        path = os.path.join(tempfile.mkdtemp(), 'praw_rate_limit')
+        first, second = FileRateLimiter(path), FileRateLimiter(path)
+        slot = first.reserve('domain', 10)
+        self.assertEqual(slot + 10, second.reserve('domain', 10))
+        self.assertEqual(slot + 20, first.reserve('domain', 10))
+        self.assertTrue(second.reserve('other', 10) < slot + 10)
+
+    def test_burst(self):
+        limiter = LocalRateLimiter()
+        start = time.time()
+        slots = [limiter.reserve('domain', 0.5, burst=3) for _ in range(5)]
+        self.assertTrue(all(slot < start + 0.1 for slot in slots[:3]))
+        self.assertAlmostEqual(slots[0] + 0.5, slots[3], places=1)
+        self.assertAlmostEqual(slots[0] + 1.0, slots[4], places=1)
+
+    def test_local_limiter(self):
+        limiter = LocalRateLimiter()
+        slot = limiter.reserve('domain', 10)
+        self.assertEqual(slot + 10, limiter.reserve('domain', 10))
+
+    def test_local_limiter_threads(self):
+        limiter = LocalRateLimiter()
+        slots = []
+
+        def reserve():
+            for _ in range(100):
+                slots.append(limiter.reserve('domain', 10))
+        threads = [threading.Thread(target=reserve) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        slots.sort()
+        self.assertEqual(400, len(set(slots)))
+        self.assertEqual(slots[0] + 3990, slots[-1])
+
+
 class RedditorTest(unittest.TestCase, AuthenticatedHelper):
     def setUp(self):
         self.configure()
@@ -788,6 +1504,32 @@ class RedditorTest(unittest.TestCase, AuthenticatedHelper):
         self.assertTrue(isinstance(self.r.user, LoggedInRedditor))
 
 
+class SessionPoolTest(unittest.TestCase, BasicHelper):
+    def setUp(self):
+        self.configure()
+        self.pool = SessionPool(USER_AGENT, [(self.un, '1111'),
+                                             (self.other_user_name, '1111')],
+                                disable_update_check=True)
+
+    def test_dispatch_least_recently_used(self):
+        first = self.pool.acquire()
+        second = self.pool.acquire()
+        self.assertNotEqual(first.user.name, second.user.name)
+        self.assertEqual(first, self.pool.acquire())
+
+    def test_separate_rate_budgets(self):
+        # pylint: disable-msg=W0212
+        keys = set(helpers._request.function.get_key(session)
+                   for session in self.pool.sessions)
+        self.assertEqual(2, len(keys))
+
+    def test_stats(self):
+        list(self.pool.get_new(limit=5))
+        stats = self.pool.stats()
+        self.assertEqual(1, sum(x['calls'] for x in stats.values()))
+        self.assertTrue(sum(x['requests'] for x in stats.values()) >= 1)
+
+
 class SubmissionTest(unittest.TestCase, AuthenticatedHelper):
     def setUp(self):
         self.configure()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+
+"""
+Microbenchmark for Submission._replace_more_comments.
+
+Builds a synthetic comment tree and serves it from memory, so no time is
+spent on the network. The expansion is timed with the current implementation
+and with the list based implementation it replaced, excluding the time spent
+building and decoding the responses.
+
+Usage: benchmark_more_comments.py [number of comments, default 10000]
+"""
+
+import json
+import random
+import sys
+import time
+
+import praw
+from praw.objects import MoreComments
+
+PERMALINK = '/r/benchmark/comments/sub/benchmark/'
+
+
+class SyntheticThread(object):
+    """A random comment tree and the API responses describing it."""
+    def __init__(self, size, initial, seed=0):
+        rnd = random.Random(seed)
+        self.children = dict((i, []) for i in range(size))
+        self.parents = {}
+        self.roots = []
+        for i in range(size):
+            if i == 0 or rnd.random() < 0.2:
+                self.roots.append(i)
+                self.parents[i] = 't3_sub'
+            else:
+                parent = rnd.randrange(i)
+                self.children[parent].append(i)
+                self.parents[i] = 't1_c%d' % parent
+        self.initial = initial
+
+    @staticmethod
+    def _more(ids, parent):
+        return {'kind': 'more',
+                'data': {'id': 'c%d' % ids[0], 'name': 't1_c%d' % ids[0],
+                         'parent_id': parent, 'count': len(ids),
+                         'children': ['c%d' % x for x in ids]}}
+
+    def _listing(self, ids, parent, nested):
+        shown = [x for x in ids if nested and x < self.initial]
+        things = [self._comment(x, parent, nested) for x in shown]
+        hidden = [x for x in ids if x not in shown]
+        for i in range(0, len(hidden), 20):
+            things.append(self._more(hidden[i:i + 20], parent))
+        return things
+
+    def _comment(self, index, parent, nested):
+        name = 't1_c%d' % index
+        replies = ''
+        if nested and self.children[index]:
+            replies = {'kind': 'Listing',
+                       'data': {'children': self._listing(
+                           self.children[index], name, True)}}
+        return {'kind': 't1',
+                'data': {'id': 'c%d' % index, 'name': name, 'body': '',
+                         'parent_id': parent, 'link_id': 't3_sub',
+                         'replies': replies, 'ups': 1, 'downs': 0}}
+
+    def request(self, page_url, params=None, url_data=None, timeout=None,
+                raw=False):  # pylint: disable-msg=W0613
+        """Stand in for BaseReddit._request."""
+        if 'morechildren' not in page_url:
+            submission = {'kind': 't3',
+                          'data': {'id': 'sub', 'name': 't3_sub',
+                                   'permalink': PERMALINK, 'title': '',
+                                   'score': 1, 'subreddit': 'benchmark'}}
+            return json.dumps([
+                {'kind': 'Listing', 'data': {'children': [submission]}},
+                {'kind': 'Listing', 'data': {'children': self._listing(
+                    self.roots, 't3_sub', True)}}])
+        things = []
+        for child in params['children'].split(','):
+            index = int(child[1:])
+            things.append(self._comment(index, self.parents[index], False))
+            things.extend(self._listing(self.children[index], 't1_' + child,
+                                        False))
+        return json.dumps({'json': {'errors': [], 'data': {'things': things}}})
+
+
+def legacy_replace_more_comments(self):
+    """The list based implementation, kept for comparison."""
+    # pylint: disable-msg=W0212
+    queue = [(None, x) for x in self.comments]
+    while len(queue) > 0:
+        parent, comm = queue.pop(0)
+        if isinstance(comm, MoreComments):
+            if parent:
+                parent.replies.remove(comm)
+            elif parent is None:
+                self._comments.remove(comm)
+            new_comments = comm.comments(update=False)
+            if new_comments is None:
+                continue
+            for comment in new_comments:
+                if isinstance(comment, MoreComments):
+                    comment._update_submission(self)
+                    queue.insert(0, (0, comment))
+                else:
+                    comment._replies = []
+                    self._insert_comment(comment)
+        else:
+            for item in comm.replies:
+                queue.append((comm, item))
+
+
+def run(thread, replace):
+    """Return the seconds spent in replace and the comments it produced."""
+    reddit = praw.Reddit('PRAW benchmark', disable_update_check=True)
+    reddit.config.api_request_delay = 0
+    reddit.config.cache_timeout = 0
+    reddit.config.more_comments_max = -1
+    reddit._request = thread.request  # pylint: disable-msg=W0212
+    submission = reddit.get_submission(PERMALINK)
+    request_json = reddit.request_json
+    request_time = [0]
+
+    def timed_request_json(*args, **kwargs):
+        start = time.time()
+        try:
+            return request_json(*args, **kwargs)
+        finally:
+            request_time[0] += time.time() - start
+    reddit.request_json = timed_request_json
+
+    start = time.time()
+    replace(submission)
+    seconds = time.time() - start - request_time[0]
+    return seconds, len(submission.comments_flat)
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    thread = SyntheticThread(size, initial=size // 2)
+    # pylint: disable-msg=W0212
+    current = praw.objects.Submission._replace_more_comments
+    for name, replace in (('legacy', legacy_replace_more_comments),
+                          ('current', current)):
+        seconds, count = run(thread, replace)
+        print('%-8s %8.3fs  %d comments' % (name, seconds, count))
+
+
+if __name__ == '__main__':
+    sys.exit(main())